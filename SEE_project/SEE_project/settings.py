@@ -146,3 +146,25 @@ STATICFILES_DIRS = [
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# 风险分析后台绘图任务队列
+RISK_JOB_WORKERS = 2  # 工作线程数
+RISK_JOB_QUEUE_SIZE = 16  # 排队+执行中的任务上限，超出返回503
+RISK_JOB_TTL = 600  # 已完成任务结果保留秒数
+RISK_ARTIFACT_MAX_BYTES = 200 * 1024 * 1024  # 风险分析图片存储上限，超出按LRU淘汰
+RISK_RENDER_DPI = 100  # 风险分析图片默认分辨率（请求中可通过dpi覆盖，范围50~300）
+RISK_TREE_MAX_SAMPLES = 5_000_000  # 风险决策树训练样本数上限
+RISK_SCENARIO_MAX_SAMPLES = 20_000_000  # 情景批量对比中 情景数×模拟次数 的上限
+RISK_TAIL_MAX_SAMPLES = 5_000_000  # 尾部风险重要性抽样的样本数上限
+RISK_SENSITIVITY_MAX_STEPS = 200  # 敏感性分析每个参数的取值个数上限
+RISK_SENSITIVITY_MAX_POINTS = 1_000_000  # 敏感性分析双参数曲面的总点数上限
+RISK_SOBOL_MAX_BASE = 2 ** 17  # Sobol全局敏感性分析的基础样本数上限
+RISK_SOBOL_MAX_RESAMPLES = 2 ** 24  # Sobol指数bootstrap中 重抽样次数×基础样本数 的上限
+
+# 进度计划
+SCHEDULE_MAX_SAMPLES = 20_000_000  # PERT进度模拟中 任务数×迭代次数 的上限
+SMOOTHING_MAX_TIME_BUDGET = 30  # 资源平滑模拟退火改进的时间预算上限（秒）
+SMOOTHING_MAX_RESTARTS = 8  # 资源平滑模拟退火的并行重启次数上限
+EXACT_MAX_TIME_LIMIT = 60  # 精确求解（MILP）模式的时间上限（秒）
+LEVELING_MAX_SWEEP = 200  # 资源均衡一次请求中扫描的资源上限个数上限
+PORTFOLIO_MAX_WORKERS = 8  # 项目组合资源均衡的工作进程数上限
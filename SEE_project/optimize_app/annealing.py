@@ -0,0 +1,146 @@
+# 资源平滑改进：在贪心结果基础上做模拟退火，多个独立重启在进程池中并行，按时间预算停止
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+def _profile(starts, durations, demands, n_days):
+    demand = [0] * n_days
+    for s, d, q in zip(starts, durations, demands):
+        for t in range(s, s + d):
+            demand[t] += q
+    return demand
+
+
+def anneal_smoothing(starts, lower, upper, durations, demands, n_days, time_budget, seed=None, randomize=False,
+                     links=None):
+    """
+    单次模拟退火
+
+    starts: 初始开始时间（相对项目开始的天数），lower/upper: 各任务开始时间的可选范围（含两端）。
+    每步随机挑一个可移动任务换一个开始时间；总需求不变，目标（平方和）的增量只需计算新旧两个窗口，O(duration)。
+    links（Precedence）不为None时，新开始时间还须满足与其他任务当前位置之间的搭接关系（初始解须可行）。
+    温度按已用时间从T0几何下降到T0/1000，时间预算用完即停止。
+    返回最优开始时间、对应方差、迭代次数与「时间-最优方差」遥测。
+    """
+    rng = random.Random(seed)
+    starts = [int(s) for s in starts]
+    lower = [int(v) for v in lower]
+    upper = [int(v) for v in upper]
+    durations = [int(d) for d in durations]
+    demands = list(demands)
+    movable = [i for i in range(len(starts)) if upper[i] > lower[i] and durations[i] > 0 and demands[i]]
+
+    def choose(i):
+        """任务i的一个随机可行开始时间"""
+        lo, hi = lower[i], upper[i]
+        if links is not None:
+            before, after = links.window(i, starts)
+            lo, hi = max(lo, before), min(hi, after)
+        return rng.randint(lo, hi)
+
+    if randomize:
+        for i in movable:
+            starts[i] = choose(i)
+
+    demand = _profile(starts, durations, demands, n_days)
+    total = sum(demand)
+    sum_sq = sum(x * x for x in demand)
+
+    def variance(value):
+        return value / n_days - (total / n_days) ** 2
+
+    def delta(i, new):
+        """把任务i移到new时平方和的变化量"""
+        old, d, q = starts[i], durations[i], demands[i]
+        overlap = max(0, min(old, new) + d - max(old, new))
+        return 2 * q * (sum(demand[new:new + d]) - sum(demand[old:old + d])) + 2 * q * q * (d - overlap)
+
+    begin = time.perf_counter()
+    best_starts, best_sum_sq = list(starts), sum_sq
+    telemetry = [(0.0, variance(sum_sq))]
+    if not movable:
+        return {'starts': best_starts, 'variance': variance(best_sum_sq), 'iterations': 0, 'telemetry': telemetry}
+
+    # 初始温度：随机移动的平均正增量
+    samples = [delta(i, rng.randint(lower[i], upper[i])) for i in (rng.choice(movable) for _ in range(100))]
+    positive = [v for v in samples if v > 0]
+    t0 = sum(positive) / len(positive) if positive else 1.0
+    temperature = t0
+
+    iterations = 0
+    while True:
+        iterations += 1
+        if iterations & 255 == 0:
+            elapsed = time.perf_counter() - begin
+            if elapsed >= time_budget:
+                break
+            temperature = t0 * 0.001 ** (elapsed / time_budget)
+        i = movable[rng.randrange(len(movable))]
+        new = choose(i)
+        if new == starts[i]:
+            continue
+        change = delta(i, new)
+        if change <= 0 or rng.random() < math.exp(-change / temperature):
+            old, d, q = starts[i], durations[i], demands[i]
+            for t in range(old, old + d):
+                demand[t] -= q
+            for t in range(new, new + d):
+                demand[t] += q
+            starts[i] = new
+            sum_sq += change
+            if sum_sq < best_sum_sq:
+                best_starts, best_sum_sq = list(starts), sum_sq
+                elapsed = time.perf_counter() - begin
+                # 遥测按预算的1%节流
+                if elapsed - telemetry[-1][0] >= time_budget / 100:
+                    telemetry.append((elapsed, variance(best_sum_sq)))
+    telemetry.append((time.perf_counter() - begin, variance(best_sum_sq)))
+    return {'starts': best_starts, 'variance': variance(best_sum_sq), 'iterations': iterations,
+            'telemetry': telemetry}
+
+
+def available_cpus():
+    """当前进程可用的CPU数"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _anneal_job(args):
+    return anneal_smoothing(*args)
+
+
+def parallel_anneal(starts, lower, upper, durations, demands, n_days, time_budget, restarts=4, seed=None,
+                    workers=None, links=None):
+    """
+    多次独立重启的模拟退火：第一次从给定（贪心）结果出发，其余从窗口内随机开始时间出发
+    （有搭接关系时依次为各任务随机选取可行的开始时间，保持初始解可行）
+
+    restarts>1 时在进程池中并行；进程数少于重启数时按轮数均分时间预算，使总耗时不超过 time_budget。
+    返回方差最小的结果及各重启的遥测。
+    """
+    workers = min(restarts, workers or available_cpus())
+    budget = time_budget / math.ceil(restarts / workers)
+    seeds = [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(restarts)]
+    jobs = [(list(starts), list(lower), list(upper), list(durations), np.asarray(demands).tolist(), n_days,
+             budget, seeds[k], k > 0, links) for k in range(restarts)]
+    if workers <= 1:
+        results = [_anneal_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_anneal_job, jobs))
+    best = min(results, key=lambda r: r['variance'])
+    return {
+        'starts': best['starts'],
+        'variance': best['variance'],
+        'restarts': [
+            {'variance': r['variance'], 'iterations': r['iterations'],
+             'telemetry': [{'time': round(t, 4), 'variance': v} for t, v in r['telemetry']]}
+            for r in results
+        ],
+    }
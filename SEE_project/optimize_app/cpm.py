@@ -0,0 +1,270 @@
+# 关键路径法（CPM）：支持FS/SS/FF/SF搭接关系与时距，基于CSR邻接数组做正向/反向推算
+import heapq
+from collections import deque
+import numpy as np
+
+LINK_TYPES = ('FS', 'SS', 'FF', 'SF')
+_LINK_CODES = {name: code for code, name in enumerate(LINK_TYPES)}
+
+
+def parse_links(tasks):
+    """
+    解析任务的前置关系，返回 (index, durations, pred, succ, kind, lag)
+
+    predecessors 的元素可以是任务id（默认FS、时距0），也可以是 {'id', 'type', 'lag'}。
+    """
+    index = {}
+    for i, task in enumerate(tasks):
+        if task['id'] in index:
+            raise ValueError(f"任务id重复: {task['id']}")
+        index[task['id']] = i
+    durations = [int(task['duration']) for task in tasks]
+    if any(d < 0 for d in durations):
+        raise ValueError("任务工期不能为负")
+
+    pred, succ, kind, lag = [], [], [], []
+    for i, task in enumerate(tasks):
+        for link in task.get('predecessors', ()):
+            if isinstance(link, dict):
+                p = index.get(link['id'])
+                link_type = link.get('type', 'FS')
+                code = _LINK_CODES.get(link_type)
+                if code is None:
+                    code = _LINK_CODES.get(str(link_type).upper())
+                    if code is None:
+                        raise ValueError(f"未知的搭接关系: {link_type}，可选: {', '.join(LINK_TYPES)}")
+                link_lag = int(link.get('lag', 0))
+            else:
+                p, code, link_lag = index.get(link), 0, 0
+            if p is None:
+                raise ValueError(f"任务{task['id']}的前置任务不存在: {link['id'] if isinstance(link, dict) else link}")
+            pred.append(p)
+            succ.append(i)
+            kind.append(code)
+            lag.append(link_lag)
+    return index, durations, pred, succ, kind, lag
+
+
+def csr(rows, cols, n, *values):
+    """按行压缩的邻接表：返回 (indptr, cols, values...)，均转换为Python列表以便逐元素循环"""
+    rows = np.asarray(rows, dtype=np.int64)
+    order = np.argsort(rows, kind='stable')
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+    return (indptr.tolist(), np.asarray(cols, dtype=np.int64)[order].tolist(),
+            *(np.asarray(v, dtype=np.int64)[order].tolist() for v in values))
+
+
+def topological_order(n, out_ptr, out_succ):
+    """Kahn算法拓扑排序，存在环时抛出ValueError"""
+    indegree = [0] * n
+    for s in out_succ:
+        indegree[s] += 1
+    queue = deque(i for i in range(n) if indegree[i] == 0)
+    order = []
+    while queue:
+        i = queue.popleft()
+        order.append(i)
+        for k in range(out_ptr[i], out_ptr[i + 1]):
+            s = out_succ[k]
+            indegree[s] -= 1
+            if indegree[s] == 0:
+                queue.append(s)
+    if len(order) != n:
+        raise ValueError("任务依赖中存在环")
+    return order
+
+
+class Precedence:
+    """
+    搭接关系的差分约束形式：start[s] - start[p] >= offset
+
+    FS: offset = d_p + lag，SS: lag，FF: d_p + lag - d_s，SF: lag - d_s。
+    用于资源平滑中移动任务时保持前置关系（时间单位与 start 一致即可，与项目起点无关）。
+    """
+
+    def __init__(self, n, durations, pred, succ, kind, lag):
+        durations = np.asarray(durations, dtype=np.int64)
+        pred = np.asarray(pred, dtype=np.int64)
+        succ = np.asarray(succ, dtype=np.int64)
+        kind = np.asarray(kind, dtype=np.int64)
+        lag = np.asarray(lag, dtype=np.int64)
+        offset = lag + np.where((kind == 0) | (kind == 2), durations[pred], 0) - np.where(kind >= 2, durations[succ], 0)
+        self.pred, self.succ, self.offset = pred, succ, offset
+        self._in = csr(succ, pred, n, offset)
+        self._out = csr(pred, succ, n, offset)
+
+    @classmethod
+    def from_tasks(cls, tasks):
+        _, durations, pred, succ, kind, lag = parse_links(tasks)
+        return cls(len(tasks), durations, pred, succ, kind, lag)
+
+    def __len__(self):
+        return len(self.pred)
+
+    def window(self, i, starts):
+        """其他任务开始时间为 starts 时，任务i开始时间的可行范围 (lo, hi)，无约束的一侧为 -inf/inf"""
+        lo, hi = self.earliest(i, starts), float('inf')
+        out_ptr, out_succ, out_offset = self._out
+        for k in range(out_ptr[i], out_ptr[i + 1]):
+            bound = starts[out_succ[k]] - out_offset[k]
+            if bound < hi:
+                hi = bound
+        return lo, hi
+
+    def earliest(self, i, starts):
+        """前置任务开始时间为 starts 时任务i的最早开始时间，没有前置任务时为 -inf"""
+        lo = float('-inf')
+        in_ptr, in_pred, in_offset = self._in
+        for k in range(in_ptr[i], in_ptr[i + 1]):
+            bound = starts[in_pred[k]] + in_offset[k]
+            if bound > lo:
+                lo = bound
+        return lo
+
+    def priority_order(self, rank):
+        """
+        满足前置关系的安排顺序（串行进度生成）
+
+        每次从前置任务均已安排的任务中取 rank 最小者（Kahn算法 + 堆），存在环时抛出ValueError。
+        """
+        n = len(rank)
+        out_ptr, out_succ, _ = self._out
+        indegree = np.bincount(self.succ, minlength=n).tolist()
+        rank = np.asarray(rank).tolist()
+        heap = [(rank[i], i) for i in range(n) if indegree[i] == 0]
+        heapq.heapify(heap)
+        order = []
+        while heap:
+            _, i = heapq.heappop(heap)
+            order.append(i)
+            for k in range(out_ptr[i], out_ptr[i + 1]):
+                s = out_succ[k]
+                indegree[s] -= 1
+                if indegree[s] == 0:
+                    heapq.heappush(heap, (rank[s], s))
+        if len(order) != n:
+            raise ValueError("任务依赖中存在环")
+        return order
+
+    def violations(self, starts):
+        """违反的搭接关系数"""
+        starts = np.asarray(starts)
+        return int(np.count_nonzero(starts[self.succ] - starts[self.pred] < self.offset))
+
+
+def critical_path(tasks):
+    """
+    关键路径计算
+
+    tasks: [{'id', 'duration', 'predecessors': [...]}, ...]，时间以天为单位、从0开始
+    返回 ES/EF/LS/LF/总时差（numpy数组，与tasks顺序一致）及项目总工期。
+    """
+    n = len(tasks)
+    index, dur, pred, succ, kind, lag = parse_links(tasks)
+    in_ptr, in_pred, in_kind, in_lag = csr(succ, pred, n, kind, lag)
+    out_ptr, out_succ, out_kind, out_lag = csr(pred, succ, n, kind, lag)
+    order = topological_order(n, out_ptr, out_succ)
+
+    # 正向推算：ES = max(各前置关系约束, 0)
+    es = [0] * n
+    ef = [0] * n
+    for i in order:
+        start = 0
+        d = dur[i]
+        for k in range(in_ptr[i], in_ptr[i + 1]):
+            p = in_pred[k]
+            t = in_kind[k]
+            if t == 0:  # FS
+                bound = ef[p] + in_lag[k]
+            elif t == 1:  # SS
+                bound = es[p] + in_lag[k]
+            elif t == 2:  # FF
+                bound = ef[p] + in_lag[k] - d
+            else:  # SF
+                bound = es[p] + in_lag[k] - d
+            if bound > start:
+                start = bound
+        es[i] = start
+        ef[i] = start + d
+    project_duration = max(ef) if n else 0
+
+    # 反向推算：LF = min(各后继关系约束, 项目总工期)
+    ls = [0] * n
+    lf = [0] * n
+    for i in reversed(order):
+        finish = project_duration
+        d = dur[i]
+        for k in range(out_ptr[i], out_ptr[i + 1]):
+            s = out_succ[k]
+            t = out_kind[k]
+            if t == 0:  # FS
+                bound = ls[s] - out_lag[k]
+            elif t == 1:  # SS
+                bound = ls[s] - out_lag[k] + d
+            elif t == 2:  # FF
+                bound = lf[s] - out_lag[k]
+            else:  # SF
+                bound = lf[s] - out_lag[k] + d
+            if bound < finish:
+                finish = bound
+        lf[i] = finish
+        ls[i] = finish - d
+
+    es = np.array(es)
+    ls = np.array(ls)
+    return {
+        'index': index,
+        'es': es,
+        'ef': np.array(ef),
+        'ls': ls,
+        'lf': np.array(lf),
+        'total_float': ls - es,
+        'project_duration': project_duration,
+    }
+
+
+def schedule_dates(tasks, start_date):
+    """
+    计算关键路径并换算为日期
+
+    es/ls 为最早/最晚开始日期，ef/lf 为最早/最晚完成日期（含当天）。
+    """
+    result = critical_path(tasks)
+    origin = np.datetime64(start_date, 'D')
+
+    def to_dates(days):
+        return np.datetime_as_string(origin + days).tolist()
+
+    columns = zip(to_dates(result['es']), to_dates(result['ls']), to_dates(result['ef'] - 1),
+                  to_dates(result['lf'] - 1), result['total_float'].tolist())
+    return [dict(task, es=es, ls=ls, ef=ef, lf=lf, total_float=total_float)
+            for task, (es, ls, ef, lf, total_float) in zip(tasks, columns)]
+
+
+if __name__ == "__main__":
+    import time
+
+    input_tasks = [
+        {"id": 1, "duration": 5, "predecessors": []},
+        {"id": 2, "duration": 5, "predecessors": [1]},
+        {"id": 3, "duration": 4, "predecessors": [{"id": 1, "type": "SS", "lag": 2}]},
+        {"id": 4, "duration": 4, "predecessors": [3, {"id": 2, "type": "FF"}]},
+    ]
+    for task in schedule_dates(input_tasks, "2025-06-11"):
+        print(task)
+
+    # 性能：100000个任务、约300000条搭接关系的随机网络
+    rng = np.random.default_rng(0)
+    n = 100000
+    big = []
+    for i in range(n):
+        preds = []
+        if i:
+            for p in set(rng.integers(max(0, i - 200), i, size=3).tolist()):
+                preds.append({"id": p, "type": LINK_TYPES[int(rng.integers(4))], "lag": int(rng.integers(0, 3))})
+        big.append({"id": i, "duration": int(rng.integers(1, 10)), "predecessors": preds})
+    t0 = time.time()
+    result = critical_path(big)
+    print(f"{n}个任务: {time.time() - t0:.2f}s, 总工期={result['project_duration']}, "
+          f"关键任务数={int((result['total_float'] == 0).sum())}")
@@ -0,0 +1,212 @@
+# 资源占用曲线：线段树（区间加 + 区间最大/最小值，懒标记），供资源均衡增量维护与查询
+class ResourceProfile:
+    """
+    整数时间轴上的资源占用曲线
+
+    add(start, end, amount) 在 [start, end) 上增加占用，peak(start, end) 查询区间内的最大占用，
+    两者均为 O(log H)。时间轴长度不够时自动倍增；origin 为时间轴起点（可以为负）。
+    """
+
+    def __init__(self, horizon=1024, origin=0):
+        self.origin = origin
+        self._size = 1
+        while self._size < horizon:
+            self._size *= 2
+        self.reset()
+
+    def reset(self):
+        """清空所有占用，保留已分配的时间轴长度"""
+        self._height = self._size.bit_length()
+        self._max = [0] * (2 * self._size)
+        self._min = [0] * (2 * self._size)
+        self._lazy = [0] * self._size
+
+    @property
+    def horizon(self):
+        return self._size
+
+    def add(self, start, end, amount):
+        """在 [start, end) 上增加 amount 的占用（amount 为负时表示释放）"""
+        if end <= start:
+            return
+        lo, hi = self._leaves(start, end)
+        l0, r0 = lo, hi
+        while lo < hi:
+            if lo & 1:
+                self._apply(lo, amount)
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                self._apply(hi, amount)
+            lo >>= 1
+            hi >>= 1
+        self._build(l0)
+        self._build(r0 - 1)
+
+    def peak(self, start, end):
+        """[start, end) 内的最大占用，空区间返回0"""
+        if end <= start:
+            return 0
+        lo, hi = self._leaves(start, end)
+        self._push(lo)
+        self._push(hi - 1)
+        tree = self._max
+        result = float('-inf')
+        while lo < hi:
+            if lo & 1:
+                result = max(result, tree[lo])
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                result = max(result, tree[hi])
+            lo >>= 1
+            hi >>= 1
+        return result
+
+    def last_above(self, start, end, threshold):
+        """[start, end) 内占用超过 threshold 的最右时刻，不存在时返回None（自顶向下一次下降，O(log H)）"""
+        if end <= start:
+            return None
+        lo, hi = self._leaves(start, end)
+        found = self._last_above(1, self._size, 2 * self._size, lo, hi, threshold)
+        return None if found is None else found - self._size + self.origin
+
+    def first_at_most(self, start, threshold):
+        """不早于 start 且占用不超过 threshold 的最早时刻（threshold >= 0 时总存在）"""
+        lo, hi = self._leaves(start, start + 1)
+        found = self._first_at_most(1, self._size, 2 * self._size, lo, threshold)
+        if found is None:
+            # 时间轴之外没有任何占用
+            return max(start, self._size + self.origin)
+        return found - self._size + self.origin
+
+    def earliest_fit(self, start, duration, amount, capacity):
+        """
+        不早于 start、可在 duration 内占用 amount 而不超过 capacity 的最早开始时刻
+
+        先跳过连续的超限时段，窗口内仍有超限时刻时跳到最右超限时刻之后
+        （中间的开始时刻都会覆盖该时刻，必然不可行）。
+        """
+        if duration <= 0:
+            return start
+        if amount > capacity:
+            raise ValueError(f"资源需求 {amount} 超过资源上限 {capacity}")
+        threshold = capacity - amount
+        while True:
+            start = self.first_at_most(start, threshold)
+            conflict = self.last_above(start, start + duration, threshold)
+            if conflict is None:
+                return start
+            start = conflict + 1
+
+    def usage(self, start, end):
+        """[start, end) 内逐时刻的占用列表"""
+        return [self.peak(t, t + 1) for t in range(start, end)]
+
+    def _leaves(self, start, end):
+        if start < self.origin:
+            raise ValueError(f"时间 {start} 早于资源曲线起点 {self.origin}")
+        while end - self.origin > self._size:
+            self._grow()
+        return start - self.origin + self._size, end - self.origin + self._size
+
+    def _apply(self, node, amount):
+        self._max[node] += amount
+        self._min[node] += amount
+        if node < self._size:
+            self._lazy[node] += amount
+
+    def _build(self, node):
+        """自底向上更新祖先节点的最大/最小值"""
+        tree_max, tree_min, lazy = self._max, self._min, self._lazy
+        while node > 1:
+            node >>= 1
+            tree_max[node] = max(tree_max[2 * node], tree_max[2 * node + 1]) + lazy[node]
+            tree_min[node] = min(tree_min[2 * node], tree_min[2 * node + 1]) + lazy[node]
+
+    def _push_node(self, node):
+        lazy = self._lazy[node]
+        if lazy:
+            self._apply(2 * node, lazy)
+            self._apply(2 * node + 1, lazy)
+            self._lazy[node] = 0
+
+    def _push(self, leaf):
+        """自顶向下下推叶子路径上的懒标记"""
+        for shift in range(self._height - 1, 0, -1):
+            self._push_node(leaf >> shift)
+
+    def _last_above(self, node, node_lo, node_hi, lo, hi, threshold):
+        """在叶子区间 [lo, hi) 内查找值大于 threshold 的最右叶子"""
+        if node_hi <= lo or hi <= node_lo or self._max[node] <= threshold:
+            return None
+        if node >= self._size:
+            return node
+        self._push_node(node)
+        mid = (node_lo + node_hi) // 2
+        found = self._last_above(2 * node + 1, mid, node_hi, lo, hi, threshold)
+        if found is None:
+            found = self._last_above(2 * node, node_lo, mid, lo, hi, threshold)
+        return found
+
+    def _first_at_most(self, node, node_lo, node_hi, lo, threshold):
+        """在不小于 lo 的叶子中查找值不超过 threshold 的最左叶子"""
+        if node_hi <= lo or self._min[node] > threshold:
+            return None
+        if node >= self._size:
+            return node
+        self._push_node(node)
+        mid = (node_lo + node_hi) // 2
+        found = self._first_at_most(2 * node, node_lo, mid, lo, threshold)
+        if found is None:
+            found = self._first_at_most(2 * node + 1, mid, node_hi, lo, threshold)
+        return found
+
+    def _grow(self):
+        """时间轴长度加倍：下推全部懒标记后用原叶子值重建"""
+        for node in range(1, self._size):
+            self._push_node(node)
+        leaves = self._max[self._size:]
+        self._size *= 2
+        self.reset()
+        self._max[self._size:self._size + len(leaves)] = leaves
+        self._min[self._size:self._size + len(leaves)] = leaves
+        for node in range(self._size - 1, 0, -1):
+            self._max[node] = max(self._max[2 * node], self._max[2 * node + 1])
+            self._min[node] = min(self._min[2 * node], self._min[2 * node + 1])
+
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    from .utils import PRIORITY_RULES, Task, capacity_sweep, check_resource_conflict, resource_leveling
+
+    # 正确性检查见 tests.py
+    random.seed(0)
+
+    # 性能：10000个任务的资源均衡
+    tasks = []
+    for i in range(10000):
+        start = random.randrange(0, 20000)
+        tasks.append(Task(i, start, start + random.randint(1, 10), random.randint(1, 3)))
+    for priority in PRIORITY_RULES:
+        t0 = time.time()
+        adjusted = resource_leveling(tasks, 12, priority=priority)
+        print(f"10000个任务资源均衡({priority}): {time.time() - t0:.2f}s, "
+              f"完工时间={max(t.end for t in adjusted)}, 冲突检查: {check_resource_conflict(adjusted, 12)}")
+
+    # 资源紧张、需要大幅后移的场景（原实现会在后移100个单位后报错）
+    t0 = time.time()
+    adjusted = resource_leveling(tasks, 4)
+    print(f"资源上限为4: {time.time() - t0:.2f}s, 完工时间={max(t.end for t in adjusted)}")
+
+    # 资源上限扫描：与逐个上限调用 resource_leveling 的耗时对比
+    capacities = list(range(3, 21))
+    t0 = time.time()
+    curve = capacity_sweep(tasks, capacities)
+    elapsed = time.time() - t0
+    t0 = time.time()
+    separate = [max(t.end for t in resource_leveling(tasks, c)) for c in capacities]
+    print(f"资源上限扫描({len(capacities)}个上限): {elapsed:.2f}s（逐个调用 {time.time() - t0:.2f}s）, "
+          f"完工时间: {separate}")
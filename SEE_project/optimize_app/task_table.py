@@ -0,0 +1,148 @@
+# 任务表：按列存储（structure of arrays）的任务数据；日期统一为int32天序号，只在序列化时转换为ISO字符串
+import numpy as np
+
+from .cpm import Precedence, critical_path
+
+DATE_UNIT = 'datetime64[D]'
+
+
+def to_ordinals(dates):
+    """ISO日期字符串批量转换为int32天序号（1970-01-01为0）"""
+    return np.asarray(dates, dtype=DATE_UNIT).astype(np.int32)
+
+
+def to_iso(days):
+    """int天序号批量转换为ISO日期字符串列表"""
+    return np.datetime_as_string(np.asarray(days, dtype=np.int64).astype(DATE_UNIT)).tolist()
+
+
+class TaskTable:
+    """
+    资源平滑/均衡使用的任务表
+
+    ids 为任务id列表，duration、demand、es、ls 为等长的numpy数组；
+    es/ls 为最早/最晚开始日期的天序号（由 Task 构造时为相对天数）。
+    links 为任务间的搭接关系（Precedence），只有由任务网络构造时才有，否则为None。
+    """
+
+    def __init__(self, ids, duration, demand, es, ls, links=None):
+        self.ids = list(ids)
+        self.duration = np.asarray(duration, dtype=np.int32)
+        self.demand = np.asarray(demand)
+        self.es = np.asarray(es, dtype=np.int32)
+        self.ls = np.asarray(ls, dtype=np.int32)
+        self.links = links
+
+    @classmethod
+    def from_records(cls, tasks):
+        """由请求中的任务列表（es/ls为ISO日期字符串，未给出ls时取es）构造，日期只解析一次"""
+        return cls(
+            [task["id"] for task in tasks],
+            [task["duration"] for task in tasks],
+            [task["demand"] for task in tasks],
+            to_ordinals([task["es"] for task in tasks]),
+            to_ordinals([task.get("ls", task["es"]) for task in tasks]),
+        )
+
+    @classmethod
+    def from_tasks(cls, tasks, links=None):
+        """由资源均衡的 Task 列表构造，es 为原始开始时间（没有时差信息，ls 取 es）；links 为任务间的搭接关系"""
+        es = np.array([t.original_start for t in tasks], dtype=np.int32)
+        return cls(
+            [t.task_id for t in tasks],
+            np.array([t.original_end for t in tasks], dtype=np.int32) - es,
+            [t.resource_demand for t in tasks],
+            es,
+            es,
+            links=links,
+        )
+
+    @classmethod
+    def from_network(cls, tasks, start_date):
+        """由任务网络（含前置关系）用关键路径法计算es/ls后构造"""
+        result = critical_path(tasks)
+        origin = to_ordinals([start_date])[0]
+        return cls(
+            [task["id"] for task in tasks],
+            [task["duration"] for task in tasks],
+            [task["demand"] for task in tasks],
+            origin + result['es'],
+            origin + result['ls'],
+            links=Precedence.from_tasks(tasks),
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def total_float(self):
+        return self.ls - self.es
+
+    @property
+    def is_critical(self):
+        return self.es == self.ls
+
+    def to_records(self, es=None):
+        """序列化为任务字典列表；es 为调整后的开始日期（天序号），默认使用最早开始日期"""
+        es = self.es if es is None else es
+        return [
+            {
+                "id": task_id,
+                "duration": duration,
+                "demand": demand,
+                "es": start,
+                "ls": latest,
+                "is_critical": critical,
+            }
+            for task_id, duration, demand, start, latest, critical in zip(
+                self.ids, self.duration.tolist(), self.demand.tolist(), to_iso(es), to_iso(self.ls),
+                self.is_critical.tolist())
+        ]
+
+
+if __name__ == "__main__":
+    import random
+    import time
+    import tracemalloc
+
+    from .utils import Task, resource_leveling, table_leveling
+
+    class DictTask:
+        """原来的任务类（每个实例带 __dict__），用于对比"""
+
+        def __init__(self, task_id, start_time, end_time, resource_demand):
+            self.task_id = task_id
+            self.original_start = start_time
+            self.original_end = end_time
+            self.start = start_time
+            self.end = end_time
+            self.resource_demand = resource_demand
+
+    n = 100000
+    random.seed(0)
+    spec = []
+    for i in range(n):
+        start = random.randrange(0, 200000)
+        spec.append((i, start, start + random.randint(1, 10), random.randint(1, 3)))
+
+    # 内存：100000个任务
+    for name, build in (('dict任务对象', lambda: [DictTask(*s) for s in spec]),
+                        ('__slots__任务对象', lambda: [Task(*s) for s in spec]),
+                        ('TaskTable', lambda: TaskTable.from_tasks([Task(*s) for s in spec]))):
+        tracemalloc.start()
+        # 构造完成后仍被引用的内存（TaskTable 构造用的临时对象已释放）
+        built = build()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"{name}: {size / n:.0f} 字节/任务")
+        del built
+
+    # 吞吐量：对象列表上的资源均衡 vs 直接在任务表上均衡
+    tasks = [Task(*s) for s in spec]
+    t0 = time.time()
+    adjusted = resource_leveling(tasks, 12)
+    print(f"resource_leveling(Task列表): {time.time() - t0:.2f}s, 完工时间={max(t.end for t in adjusted)}")
+    table = TaskTable.from_tasks([Task(*s) for s in spec])
+    t0 = time.time()
+    starts = table_leveling(table, 12)
+    print(f"table_leveling(TaskTable): {time.time() - t0:.2f}s, 完工时间={int((starts + table.duration).max())}")
@@ -1,160 +1,237 @@
-from django.test import TestCase
-
-# Create your tests here.
-from datetime import datetime, timedelta
-
+import json
+import random
+from types import SimpleNamespace
+from unittest import mock
 
-from datetime import datetime, timedelta
 import numpy as np
+from django.test import TestCase
 
-
-def parse_date(date_str):
-    """解析日期字符串为datetime对象"""
-    return datetime.strptime(date_str, "%Y-%m-%d")
-
-
-def resource_smoothing(tasks):
-    """资源平滑算法实现"""
-    # 解析日期并计算任务的时间窗口
-    for task in tasks:
-        task["es_date"] = parse_date(task["es"])
-        task["ls_date"] = parse_date(task["ls"])
-        task["start_window"] = (task["es_date"], task["ls_date"])
-        task["end_date"] = task["es_date"] + timedelta(days=task["duration"])
-        task["is_critical"] = (task["es"] == task["ls"])
-
-    # 找出项目的开始和结束日期
-    project_start = min(task["es_date"] for task in tasks)
-    project_end = max(task["end_date"] for task in tasks)
-
-    # 创建时间轴
-    timeline = [(project_start + timedelta(days=i)) for i in range((project_end - project_start).days + 1)]
-
-    # 初始化资源分配结果
-    result_tasks = tasks.copy()
-
-    # 计算资源需求曲线（初始状态）
-    initial_resource_demand = calculate_resource_demand(result_tasks, timeline)
-
-    # 按总时差排序非关键任务（从大到小）
-    non_critical_tasks = [t for t in result_tasks if not t["is_critical"]]
-    non_critical_tasks.sort(key=lambda x: (x["ls_date"] - x["es_date"]).days, reverse=True)
-
-    # 为每个非关键任务寻找最优开始时间
-    for task in non_critical_tasks:
-        best_start_date = task["es_date"]
-        min_variation = float('inf')
-
-        # 在任务的时间窗口内尝试不同的开始时间
-        current_date = task["es_date"]
-        while current_date <= task["ls_date"]:
-            # 临时修改任务开始时间
-            original_start = task["es_date"]
-            task["es_date"] = current_date
-            task["end_date"] = current_date + timedelta(days=task["duration"])
-
-            # 计算新的资源需求曲线
-            new_resource_demand = calculate_resource_demand(result_tasks, timeline)
-            variation = calculate_variation(new_resource_demand)
-
-            # 更新最优解
-            if variation < min_variation:
-                min_variation = variation
-                best_start_date = current_date
-
-            # 恢复任务开始时间
-            task["es_date"] = original_start
-            task["end_date"] = original_start + timedelta(days=task["duration"])
-
-            # 尝试下一个可能的开始时间（每天递增）
-            current_date += timedelta(days=1)
-
-        # 应用最优开始时间
-        task["es_date"] = best_start_date
-        task["end_date"] = best_start_date + timedelta(days=task["duration"])
-
-    # 计算优化后的资源需求曲线
-    optimized_resource_demand = calculate_resource_demand(result_tasks, timeline)
-
-    # 格式化结果
-    formatted_tasks = []
-    for task in result_tasks:
-        formatted_tasks.append({
-            "id": task["id"],
-            "duration": task["duration"],
-            "demand": task["demand"],
-            "es": task["es_date"].strftime("%Y-%m-%d"),
-            "ls": task["ls"].strftime("%Y-%m-%d") if isinstance(task["ls"], datetime) else task["ls"],
-            "is_critical": task["is_critical"]
-        })
-
-    return {
-        "original_tasks": tasks,
-        "optimized_tasks": formatted_tasks,
-        "original_demand": initial_resource_demand,
-        "optimized_demand": optimized_resource_demand,
-        "timeline": timeline
-    }
-
-
-def calculate_resource_demand(tasks, timeline):
-    """计算给定时间轴上的资源需求"""
-    demand = [0] * len(timeline)
-    for task in tasks:
-        for i, date in enumerate(timeline):
-            if task["es_date"] <= date < task["end_date"]:
-                demand[i] += task["demand"]
-    return demand
-
-
-def calculate_variation(demand):
-    """计算资源需求的波动程度（使用方差）"""
-    return np.var(demand)
-
-
-def print_results(results):
-    """打印资源平滑结果"""
-    print("\n===== 资源平滑结果 =====")
-
-    print("\n原始任务安排:")
-    for task in results["original_tasks"]:
-        print(f"任务 {task['id']}: 持续时间={task['duration']}, 资源需求={task['demand']}, "
-              f"最早开始={task['es']}, 最晚开始={task['ls']}, 关键={task['is_critical']}")
-
-    print("\n优化后的任务安排:")
-    for task in results["optimized_tasks"]:
-        print(f"任务 {task['id']}: 持续时间={task['duration']}, 资源需求={task['demand']}, "
-              f"开始时间={task['es']}, 最晚开始={task['ls']}, 关键={task['is_critical']}")
-
-    print("\n资源需求统计:")
-    print(f"原始资源需求方差: {calculate_variation(results['original_demand']):.2f}")
-    print(f"优化后资源需求方差: {calculate_variation(results['optimized_demand']):.2f}")
-    print(
-        f"资源需求方差减少: {calculate_variation(results['original_demand']) - calculate_variation(results['optimized_demand']):.2f}")
-
-    # 打印资源需求曲线
-    print("\n资源需求曲线:")
-    dates = [date.strftime("%Y-%m-%d") for date in results["timeline"]]
-    for i, date in enumerate(dates):
-        print(f"{date}: 原始需求={results['original_demand'][i]}, 优化后需求={results['optimized_demand'][i]}")
-
-
-# 主函数
-def main():
-    input_tasks = [
-        # 关键任务（总时差=0，不可调整）
-        {"id": 1, "duration": 5, "demand": 3, "es": "2025-06-11", "ls": "2025-06-11"},
-        {"id": 2, "duration": 5, "demand": 3, "es": "2025-06-16", "ls": "2025-06-16"},
-
-        # 非关键任务（总时差>0，可调整）
-        {"id": 3, "duration": 4, "demand": 2, "es": "2025-06-11", "ls": "2025-06-14"},
-        {"id": 4, "duration": 4, "demand": 2, "es": "2025-06-13", "ls": "2025-06-16"}
-    ]
-
-    results = resource_smoothing(input_tasks)
-    print_results(results)
-
-
-if __name__ == "__main__":
-    main()
-
+from . import exact
+from .capacity import CapacityProfile
+from .cpm import LINK_TYPES, Precedence
+from .portfolio import portfolio_leveling
+from .resource_profile import ResourceProfile
+from .task_table import TaskTable
+from .utils import (PRIORITY_RULES, TABLE_PRIORITY_KEYS, Task, capacity_sweep, check_resource_conflict,
+                    multi_resource_leveling, network_tasks, resource_leveling, table_leveling)
+
+
+def random_tasks(n, span, seed=0):
+    rng = random.Random(seed)
+    tasks = []
+    for i in range(n):
+        start = rng.randrange(0, span)
+        tasks.append(Task(i, start, start + rng.randint(1, 10), rng.randint(1, 3)))
+    return tasks
+
+
+def random_network(n, rng):
+    """随机任务网络：每个任务有0~2个前置任务，搭接类型与间隔随机"""
+    tasks = []
+    for i in range(n):
+        predecessors = []
+        for p in rng.sample(range(i), min(i, rng.randint(0, 2))):
+            if rng.random() < 0.5:
+                predecessors.append(p)
+            else:
+                predecessors.append({'id': p, 'type': rng.choice(LINK_TYPES), 'lag': rng.randint(0, 2)})
+        tasks.append({'id': i, 'duration': rng.randint(1, 5), 'demand': rng.randint(1, 3),
+                      'predecessors': predecessors})
+    return tasks
+
+
+class ResourceProfileTests(TestCase):
+    """线段树资源占用曲线与逐时刻累加的朴素结果对比"""
+
+    def test_queries_match_naive(self):
+        rng = random.Random(0)
+        profile = ResourceProfile(horizon=8)
+        naive = [0] * 300
+        for _ in range(1000):
+            start = rng.randrange(0, 290)
+            end = start + rng.randrange(0, 10)
+            amount = rng.randint(-3, 5)
+            profile.add(start, end, amount)
+            for t in range(start, end):
+                naive[t] += amount
+            a = rng.randrange(0, 300)
+            b = rng.randrange(a, 301)
+            self.assertEqual(profile.peak(a, b), max(naive[a:b]) if b > a else 0)
+            above = [t for t in range(a, b) if naive[t] > 4]
+            self.assertEqual(profile.last_above(a, b, 4), above[-1] if above else None)
+            self.assertEqual(profile.first_at_most(a, 2), next((t for t in range(a, 300) if naive[t] <= 2), 300))
+
+    def test_earliest_fit_matches_naive(self):
+        rng = random.Random(1)
+        profile = ResourceProfile(horizon=8)
+        naive = [0] * 2000
+        for _ in range(300):
+            start, duration, amount = rng.randrange(0, 200), rng.randint(1, 8), rng.randint(1, 5)
+            fit = profile.earliest_fit(start, duration, amount, 6)
+            expected = start
+            while any(naive[t] + amount > 6 for t in range(expected, expected + duration)):
+                expected += 1
+            self.assertEqual(fit, expected)
+            profile.add(fit, fit + duration, amount)
+            for t in range(fit, fit + duration):
+                naive[t] += amount
+
+    def test_capacity_sweep_matches_separate_runs(self):
+        tasks = random_tasks(500, 1000)
+        capacities = list(range(3, 12))
+        curve = capacity_sweep(tasks, capacities)
+        separate = [max(t.end for t in resource_leveling(tasks, c)) for c in capacities]
+        self.assertEqual([p['finish'] for p in curve], separate)
+
+
+class CapacityTests(TestCase):
+    """多资源类型均衡与单资源均衡、朴素计算对比"""
+
+    def test_single_type_matches_resource_leveling(self):
+        tasks = random_tasks(500, 1000)
+        for priority in PRIORITY_RULES:
+            single = [(t.task_id, t.start, t.end) for t in resource_leveling(tasks, 5, priority=priority)]
+            multi = [(t.task_id, t.start, t.end) for t in multi_resource_leveling(tasks, {'staff': 5}, priority=priority)]
+            self.assertEqual(single, multi, priority)
+
+    def test_time_varying_capacity_matches_naive(self):
+        rng = random.Random(2)
+        calendar = np.array([[rng.randint(2, 6) for _ in range(200)] for _ in range(3)])
+        profile = CapacityProfile(calendar, horizon=8)
+        for _ in range(300):
+            start, duration = rng.randrange(0, 250), rng.randint(1, 8)
+            demand = np.array([rng.randint(0, 2) for _ in range(3)])
+            fit = profile.earliest_fit(start, duration, demand)
+            expected = start
+            while np.any(profile.usage[:, expected:expected + duration] + demand[:, None]
+                         > profile.capacity[:, expected:expected + duration]):
+                expected += 1
+            self.assertEqual(fit, expected)
+            profile.add(fit, fit + duration, demand)
+            self.assertIsNone(profile.overload())
+
+
+class PortfolioTests(TestCase):
+    """项目组合均衡与所有项目一次串行安排的结果对比"""
+
+    def setUp(self):
+        rng = random.Random(3)
+        self.projects = []
+        for p in range(20):
+            begin = p * 60 + rng.randint(-25, 25)
+            spec = [(i, rng.randint(1, 8), rng.randint(1, 3), begin + rng.randrange(0, 30)) for i in range(30)]
+            ids, durations, demands, es = zip(*spec)
+            self.projects.append({'id': p, 'priority': rng.randint(0, 3),
+                                  'tasks': TaskTable(ids, durations, demands, es, es)})
+
+    def serial(self, max_resource):
+        columns = [np.concatenate([getattr(p['tasks'], name) for p in self.projects])
+                   for name in ('duration', 'demand', 'es')]
+        table = TaskTable(range(len(columns[0])), columns[0], columns[1], columns[2], columns[2])
+        rank = np.concatenate([np.full(len(p['tasks']), p['priority']) for p in self.projects])
+        order = np.lexsort(((rank,) + TABLE_PRIORITY_KEYS['earliest_start'](table))[::-1])
+        return table_leveling(table, max_resource, order=order)
+
+    def test_matches_serial(self):
+        whole = self.serial(5)
+        for workers in (1, 2):
+            result = portfolio_leveling(self.projects, 5, workers=workers)
+            combined = np.concatenate([result['starts'][p['id']] for p in self.projects])
+            self.assertTrue(np.array_equal(combined, whole), workers)
+
+    def test_demand_over_capacity(self):
+        with self.assertRaises(ValueError):
+            portfolio_leveling(self.projects, 2)
+
+
+class PrecedenceLevelingTests(TestCase):
+    """由任务网络构造时，资源均衡须保持搭接关系且不超过资源上限"""
+
+    def test_links_and_capacity_hold(self):
+        rng = random.Random(4)
+        for _ in range(100):
+            records = random_network(8, rng)
+            links = Precedence.from_tasks(records)
+            for priority in PRIORITY_RULES:
+                adjusted = resource_leveling(network_tasks(records), 3, priority=priority, links=links)
+                starts = {t.task_id: t.start for t in adjusted}
+                self.assertEqual(links.violations([starts[r['id']] for r in records]), 0)
+                self.assertIsNone(check_resource_conflict(adjusted, 3))
+            tasks = network_tasks(records)
+            multi_resource_leveling(tasks, {'staff': 3}, links=links)
+            self.assertEqual(links.violations([t.start for t in tasks]), 0)
+
+    def test_view_keeps_finish_to_start(self):
+        body = {
+            'tasks': [{'id': 1, 'duration': 3, 'demand': 2},
+                      {'id': 2, 'duration': 3, 'demand': 3},
+                      {'id': 3, 'duration': 2, 'demand': 1, 'predecessors': [1]}],
+            'start_date': '2025-06-01', 'max_resource': 3, 'priority': 'most_demand',
+        }
+        response = self.client.post('/optimize/leveling/', json.dumps(body), content_type='application/json')
+        records = {r['id']: r for r in response.json()['msg']}
+        self.assertGreater(records[3]['es'], records[1]['ls'])
+
+    def test_exact_fallback_serializes_schedule(self):
+        body = {'tasks': [{'id': i, 'duration': 3, 'demand': 2, 'es': '2025-06-01'} for i in range(3)],
+                'max_resource': 3, 'method': 'exact'}
+        # 变量数超过上限时退回启发式结果
+        with mock.patch.object(exact, 'MAX_VARIABLES', 1):
+            response = self.client.post('/optimize/leveling/', json.dumps(body), content_type='application/json')
+        data = response.json()
+        self.assertEqual(data['exact']['status'], 'fallback')
+        self.assertEqual(data['project_duration'], 9)
+        self.assertEqual(sorted(r['delay'] for r in data['msg']), [0, 3, 6])
+
+
+class LevelingValidationTests(TestCase):
+    """资源均衡请求中的工期、需求须为非负整数"""
+
+    def post(self, body):
+        return self.client.post('/optimize/leveling/', json.dumps(body), content_type='application/json')
+
+    def test_rejects_negative_or_fractional_values(self):
+        for duration, demand in ((-3, 2), (3, -1), (1.5, 2), (None, 2), (3, 'x')):
+            body = {'tasks': [{'id': 1, 'duration': duration, 'demand': demand, 'es': '2025-06-01'}],
+                    'max_resource': 3}
+            self.assertEqual(self.post(body).status_code, 400, (duration, demand))
+        network = {'tasks': [{'id': 1, 'duration': -2, 'demand': 1}], 'start_date': '2025-06-01', 'max_resource': 3}
+        self.assertEqual(self.post(network).status_code, 400)
+        multi = {'tasks': [{'id': 1, 'duration': 2, 'demand': {'staff': -1}, 'es': '2025-06-01'}],
+                 'capacity': {'staff': 3}}
+        self.assertEqual(self.post(multi).status_code, 400)
+
+    def test_accepts_integral_floats(self):
+        body = {'tasks': [{'id': 1, 'duration': 3.0, 'demand': 2.0, 'es': '2025-06-01'}], 'max_resource': 3}
+        response = self.post(body)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['project_duration'], 3)
+
+
+class ExactReportTests(TestCase):
+    """精确求解报告中的界与差距须与目标值同一口径"""
+
+    def test_gap_on_reported_scale(self):
+        result = SimpleNamespace(x=np.zeros(1), status=1, message='', mip_dual_bound=100.0, mip_gap=0.5)
+        report = exact._report(result, 0.0, 20.0, 12.0, to_objective=lambda v: v / 10)
+        self.assertEqual(report['status'], 'time_limit')
+        self.assertEqual(report['bound'], 10.0)
+        self.assertAlmostEqual(report['gap'], 2 / 12)
+
+    def test_optimal_bound_matches_objective(self):
+        # 任务不从时刻0开始：界须加上项目起点
+        tasks = [Task(i, 5 + i % 3, 5 + i % 3 + 2, 2) for i in range(6)]
+        _, report = exact.exact_leveling(tasks, 4, time_limit=10)
+        self.assertEqual(report['status'], 'optimal')
+        self.assertAlmostEqual(report['bound'], report['objective'])
+        self.assertAlmostEqual(report['gap'], 0.0)
+
+        records = [{'id': i, 'duration': 2, 'demand': 1 + i % 2, 'es': '2025-06-01', 'ls': '2025-06-04'}
+                   for i in range(5)]
+        records.append({'id': 5, 'duration': 6, 'demand': 1, 'es': '2025-06-01', 'ls': '2025-06-01'})
+        with mock.patch('builtins.print'):
+            results = exact.exact_smoothing(records, objective='variance', time_limit=10)
+        report = results['exact']
+        self.assertEqual(report['status'], 'optimal')
+        self.assertAlmostEqual(report['bound'], report['objective'], places=6)
+        self.assertAlmostEqual(report['gap'], 0.0, places=6)
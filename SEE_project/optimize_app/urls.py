@@ -4,4 +4,5 @@ from .views import *
 urlpatterns = [
     path('leveling/', leveling_view, name='leveling'),
     path('smooth/', smooth_view, name='smooth'),
+    path('schedule/', schedule_view, name='schedule'),
 ]
\ No newline at end of file
@@ -1,7 +1,19 @@
 # Resource Leveling：通过调整任务的开始和结束时间，解决资源过度分配（如资源冲突或超负荷）的问题，确保资源使用不超过可用限制
 # Resource Smoothing：在不改变项目总工期的前提下，调整非关键路径任务的资源分配，使资源需求波动最小化
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from .annealing import parallel_anneal
+from .capacity import CapacityProfile, capacity_calendar, demand_matrix
+from .cpm import Precedence, critical_path
+from .resource_profile import ResourceProfile
+from .task_table import TaskTable, to_iso, to_ordinals
+
 
 class Task:
+    __slots__ = ('task_id', 'original_start', 'original_end', 'start', 'end', 'resource_demand')
+
     def __init__(self, task_id, start_time, end_time, resource_demand):
         self.task_id = task_id
         self.original_start = start_time  # 原始开始时间
@@ -15,62 +27,272 @@ class Task:
 
 
 def check_resource_conflict(tasks, max_resource):
-    """检查当前任务列表是否存在资源冲突"""
-    timeline = {}
-    # 收集所有时间点并排序
-    time_points = sorted(set([t.start for t in tasks] + [t.end for t in tasks]))
-
+    """检查当前任务列表是否存在资源冲突（事件扫描，O(T log T)）"""
+    # 每个任务在开始时刻占用资源、在结束时刻释放资源
+    events = {}
+    for t in tasks:
+        if t.end > t.start:
+            events[t.start] = events.get(t.start, 0) + t.resource_demand
+            events[t.end] = events.get(t.end, 0) - t.resource_demand
+    time_points = sorted(events)
+
+    total_usage = 0
     for i in range(len(time_points) - 1):
         current_start = time_points[i]
         current_end = time_points[i + 1]
-        # 计算当前时间段内的资源使用总量
-        total_usage = sum(
-            t.resource_demand
-            for t in tasks
-            if t.start <= current_start and t.end >= current_end
-        )
+        # 当前时间段内的资源使用总量
+        total_usage += events[current_start]
         if total_usage > max_resource:
             return (current_start, current_end, total_usage)
     return None
 
 
-def resource_leveling(tasks, max_resource):
-    """资源均衡主函数（贪心调整策略）"""
-    # 按原始开始时间排序任务（可根据实际需求调整排序策略）
-    sorted_tasks = sorted(tasks, key=lambda t: t.original_start)
-    adjusted_tasks = []
+def total_demand(task):
+    """任务的总资源需求（多资源类型时为各类需求之和）"""
+    demand = task.resource_demand
+    if isinstance(demand, dict):
+        return sum(demand.values())
+    if isinstance(demand, (list, tuple)):
+        return sum(demand)
+    return demand
+
+
+# 资源均衡的任务优先规则：排序键越小越先安排
+PRIORITY_RULES = {
+    'earliest_start': lambda t: t.original_start,
+    'longest_duration': lambda t: (t.original_start - t.original_end, t.original_start),
+    'most_demand': lambda t: (-total_demand(t), t.original_start),
+}
+
+
+def leveling_order(tasks, priority='earliest_start'):
+    """按优先规则排序的任务列表（串行进度生成的安排顺序）"""
+    if priority not in PRIORITY_RULES:
+        raise ValueError(f"未知的优先规则: {priority}，可选: {', '.join(PRIORITY_RULES)}")
+    return sorted(tasks, key=PRIORITY_RULES[priority])
+
+
+# 与 PRIORITY_RULES 对应的任务表排序键（按列给出，前面的列优先）
+TABLE_PRIORITY_KEYS = {
+    'earliest_start': lambda table: (table.es,),
+    'longest_duration': lambda table: (-table.duration, table.es),
+    'most_demand': lambda table: (-table.demand, table.es),
+}
+
+
+def table_order(table, priority='earliest_start'):
+    """
+    任务表按优先规则的安排顺序（下标数组；稳定排序，与 leveling_order 一致）
 
-    for task in sorted_tasks:
-        # 初始使用原始时间
-        candidate_start = task.original_start
-        candidate_end = task.original_end
+    任务表带搭接关系时，每次从前置任务均已安排的任务中按优先规则取下一个（拓扑序 + 优先规则）。
+    """
+    if priority not in TABLE_PRIORITY_KEYS:
+        raise ValueError(f"未知的优先规则: {priority}，可选: {', '.join(TABLE_PRIORITY_KEYS)}")
+    order = np.lexsort(TABLE_PRIORITY_KEYS[priority](table)[::-1])
+    if table.links is not None and len(table.links):
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        order = np.array(table.links.priority_order(rank), dtype=np.int64)
+    return order
 
-        while True:
-            # 创建临时任务列表检查冲突
-            temp_tasks = adjusted_tasks + [Task(
-                task.task_id, candidate_start, candidate_end, task.resource_demand
-            )]
 
-            conflict = check_resource_conflict(temp_tasks, max_resource)
-            if not conflict:
-                break  # 无冲突，确定当前时间
+def table_leveling(table, max_resource, priority='earliest_start', order=None, profile=None):
+    """
+    在任务表上直接做资源均衡（串行进度生成），返回调整后的开始时间数组（与 table.es 同单位）
 
-            # 存在冲突时，将任务开始时间后移1单位时间（可根据需求调整步长）
-            candidate_start += 1
-            candidate_end += 1
+    只读写数组与资源占用曲线，不创建任务对象；order/profile 可由调用方预先计算并复用（profile 会被清空）。
+    任务表带搭接关系时，任务还不早于各前置任务（已按 order 先安排）的开始时间加搭接间隔，order 须为满足前置关系的顺序。
+    """
+    starts = table.es.astype(np.int64)
+    if not len(table):
+        return starts
+    if order is None:
+        order = table_order(table, priority)
+    if profile is None:
+        profile = ResourceProfile(origin=int(starts.min()), horizon=int((starts + table.duration).max() - starts.min()))
+    else:
+        profile.reset()
+    es, durations, demands = starts.tolist(), table.duration.tolist(), table.demand.tolist()
+    links = table.links if table.links is not None and len(table.links) else None
+    placed = list(es)
+    for i in order.tolist():
+        duration, demand = durations[i], demands[i]
+        lower = es[i] if links is None else max(es[i], links.earliest(i, placed))
+        try:
+            start = profile.earliest_fit(int(lower), duration, demand, max_resource)
+        except ValueError:
+            raise ValueError(f"任务{table.ids[i]}的资源需求{demand}超过资源上限{max_resource}，无法安排")
+        profile.add(start, start + duration, demand)
+        starts[i] = placed[i] = start
+    return starts
+
+
+def resource_leveling(tasks, max_resource, priority='earliest_start', links=None):
+    """
+    资源均衡主函数（串行进度生成）
 
-            # 防止无限循环（实际应用中应添加最大调整次数限制）
-            if candidate_start > 100:
-                raise ValueError(f"任务{task.task_id}无法找到可用时间窗口")
+    按优先规则依次安排任务，每个任务放到不早于原始开始时间、且整个工期内资源不超限的最早时刻；
+    最早可行时刻由资源占用曲线一次下降查询得到，不再逐单位后移，也没有时间上限。
+    计算在任务表上进行（table_leveling），最后写回任务的 start/end，按安排顺序返回。
+    links（cpm.Precedence，可选）为任务间的搭接关系，给出时任务按拓扑序安排，且不早于前置任务约束的时刻。
+    """
+    table = TaskTable.from_tasks(tasks, links)
+    order = table_order(table, priority)
+    starts = table_leveling(table, max_resource, order=order).tolist()
+    adjusted_tasks = []
+    for i in order.tolist():
+        task = tasks[i]
+        task.start = starts[i]
+        task.end = starts[i] + task.original_end - task.original_start
+        adjusted_tasks.append(task)
+    return adjusted_tasks
 
-        # 更新任务时间
-        task.start = candidate_start
-        task.end = candidate_end
+
+def capacity_sweep(tasks, capacities, priority='earliest_start', links=None):
+    """
+    同一任务集在多个资源上限下的资源均衡，返回「资源上限-完工时间」曲线
+
+    任务表、安排顺序只构造一次，各资源上限共用同一条资源占用曲线（reset后复用已分配的时间轴）；
+    上限不低于原计划资源峰值时直接返回原完工时间。不修改任务；上限小于最大单任务需求时不可行，完工时间为None。
+    links 同 resource_leveling。
+    """
+    table = TaskTable.from_tasks(tasks, links)
+    order = table_order(table, priority)
+    if not len(table):
+        return [{'max_resource': capacity, 'finish': None} for capacity in capacities]
+    ends = table.es.astype(np.int64) + table.duration
+    peak_demand = table.demand.max()
+    unleveled_finish = int(ends.max())
+    profile = ResourceProfile(origin=int(table.es.min()), horizon=unleveled_finish - int(table.es.min()))
+    # 原计划的资源峰值：上限不低于峰值时无需调整
+    for start, end, demand in zip(table.es.tolist(), ends.tolist(), table.demand.tolist()):
+        profile.add(start, end, demand)
+    unleveled_peak = profile.peak(profile.origin, unleveled_finish)
+
+    curve = []
+    for capacity in capacities:
+        if capacity < peak_demand:
+            curve.append({'max_resource': capacity, 'finish': None})
+        elif capacity >= unleveled_peak:
+            curve.append({'max_resource': capacity, 'finish': unleveled_finish})
+        else:
+            starts = table_leveling(table, capacity, order=order, profile=profile)
+            curve.append({'max_resource': capacity, 'finish': int((starts + table.duration).max())})
+    return curve
+
+
+def multi_resource_leveling(tasks, capacity, priority='earliest_start', links=None):
+    """
+    多资源类型的资源均衡（串行进度生成）
+
+    capacity: {资源类型: 上限}，上限为常数或从时刻0起逐日的上限列表；
+    task.resource_demand 为 {资源类型: 数量}（只有一类资源时也可以是单个数值）。
+    每个任务放到不早于原始开始时间、且工期内所有资源类型都不超过当日上限的最早时刻。
+    links 同 resource_leveling。
+    """
+    types, calendar = capacity_calendar(capacity)
+    if priority not in PRIORITY_RULES:
+        raise ValueError(f"未知的优先规则: {priority}，可选: {', '.join(PRIORITY_RULES)}")
+    order = sorted(range(len(tasks)), key=lambda i: PRIORITY_RULES[priority](tasks[i]))
+    if links is not None and len(links):
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        order = links.priority_order(rank)
+    demands = demand_matrix([tasks[i].resource_demand for i in order], types)
+    adjusted_tasks = []
+    if not tasks:
+        return adjusted_tasks
+    profile = CapacityProfile(calendar, horizon=max(t.original_end for t in tasks))
+    placed = [t.original_start for t in tasks]
+
+    for i, demand in zip(order, demands):
+        task = tasks[i]
+        duration = task.original_end - task.original_start
+        lower = task.original_start
+        if links is not None:
+            lower = max(lower, links.earliest(i, placed))
+        try:
+            start = profile.earliest_fit(int(lower), duration, demand)
+        except ValueError as e:
+            raise ValueError(f"任务{task.task_id}无法安排: {e}")
+
+        task.start = placed[i] = start
+        task.end = start + duration
+        profile.add(task.start, task.end, demand)
         adjusted_tasks.append(task)
 
     return adjusted_tasks
 
 
+def check_capacity_conflict(tasks, capacity):
+    """检查多资源类型的任务安排是否超过资源日历，返回第一个冲突 (时刻, 资源类型, 使用量, 上限) 或None"""
+    types, calendar = capacity_calendar(capacity)
+    demands = demand_matrix([t.resource_demand for t in tasks], types)
+    profile = CapacityProfile(calendar)
+    for task, demand in zip(tasks, demands):
+        profile.add(task.start, task.end, demand)
+    conflict = profile.overload()
+    if conflict is None:
+        return None
+    t, r, usage, limit = conflict
+    return t, types[r], usage, limit
+
+
+def network_tasks(tasks):
+    """由任务网络（含 duration、demand、predecessors）按关键路径最早时间构造资源均衡用的 Task 列表"""
+    result = critical_path(tasks)
+    return [Task(task['id'], int(result['es'][i]), int(result['ef'][i]), task['demand'])
+            for i, task in enumerate(tasks)]
+
+
+def _non_negative_int(value, field, task_id):
+    """工期、需求须为非负整数（允许 2.0 这样的整数值），否则抛出ValueError"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value != int(value) or value < 0:
+        raise ValueError(f"任务{task_id}的{field}须为非负整数: {value!r}")
+    return int(value)
+
+
+def validate_leveling_records(records):
+    """校验资源均衡请求中的任务：duration 与 demand（或多资源需求字典中的各项）须为非负整数"""
+    if not isinstance(records, list):
+        raise ValueError("任务须为列表")
+    for task in records:
+        _non_negative_int(task["duration"], "duration", task["id"])
+        demand = task["demand"]
+        for amount in (demand.values() if isinstance(demand, dict) else [demand]):
+            _non_negative_int(amount, "demand", task["id"])
+    return records
+
+
+def leveling_tasks(records, start_date=None):
+    """
+    由请求中的任务列表构造资源均衡用的 Task 列表，返回 (项目开始天序号, 任务列表, 搭接关系)
+
+    任务给出 es（ISO日期）和 duration 时直接使用，搭接关系为None；否则按前置关系用关键路径法从 start_date 起计算，
+    并返回任务间的搭接关系（cpm.Precedence），均衡时须保持。Task 的时间为相对项目开始的天数。
+    duration、demand 须为非负整数，否则抛出ValueError。
+    """
+    validate_leveling_records(records)
+    if records and all("es" in task for task in records):
+        es = to_ordinals([task["es"] for task in records])
+        origin = int(es.min())
+        return origin, [Task(task["id"], int(s) - origin, int(s) - origin + int(task["duration"]), task["demand"])
+                        for task, s in zip(records, es)], None
+    if start_date is None:
+        raise ValueError("任务未给出es时必须提供项目开始日期start_date")
+    return int(to_ordinals([start_date])[0]), network_tasks(records), Precedence.from_tasks(records)
+
+
+def leveling_records(tasks, origin):
+    """资源均衡结果序列化为 {id, es, ls, delay} 列表（ls 为最后一个工作日，与 update_ls_dates 一致）"""
+    starts = np.array([t.start for t in tasks], dtype=np.int64) + origin
+    ends = np.array([t.end for t in tasks], dtype=np.int64) + origin
+    return [
+        {"id": task.task_id, "es": es, "ls": ls, "delay": task.start - task.original_start}
+        for task, es, ls in zip(tasks, to_iso(starts), to_iso(np.maximum(ends - 1, starts)))
+    ]
+
+
 # 示例演示
 # if __name__ == "__main__":
 #     # 初始任务列表（假设资源限制为2单位）
@@ -101,10 +323,6 @@ def resource_leveling(tasks, max_resource):
 #         print(f"发现冲突：时间段 {conflict[0]}-{conflict[1]}，资源使用量 {conflict[2]}")
 
 
-from datetime import datetime, timedelta
-
-import numpy as np
-
 
 def update_ls_dates(data):
     """
@@ -116,15 +334,13 @@ def update_ls_dates(data):
     返回:
     list: 更新后的任务信息列表
     """
-    for task in data:
-        # 将ES字符串转换为日期对象
-        es_date = datetime.strptime(task["es"], "%Y-%m-%d")
-
-        # 计算LS日期（ES日期 + duration天）
-        ls_date = es_date + timedelta(days=task["duration"]-1)
-
-        # 将计算出的日期转换回字符串格式并更新LS字段
-        task["ls"] = ls_date.strftime("%Y-%m-%d")
+    if not data:
+        return data
+    # ES日期批量转换为天序号，LS = ES + duration - 1
+    es = to_ordinals([task["es"] for task in data])
+    durations = np.array([task["duration"] for task in data], dtype=np.int32)
+    for task, ls in zip(data, to_iso(es + durations - 1)):
+        task["ls"] = ls
 
     return data
 
@@ -134,116 +350,131 @@ def parse_date(date_str):
     return datetime.strptime(date_str, "%Y-%m-%d")
 
 
-def resource_smoothing(tasks):
-    """资源平滑算法实现"""
-    # 解析日期并计算任务的时间窗口
-    for task in tasks:
-        task["es_date"] = parse_date(task["es"])
-        task["ls_date"] = parse_date(task["ls"])
-        task["start_window"] = (task["es_date"], task["ls_date"])
-        task["end_date"] = task["es_date"] + timedelta(days=task["duration"])
-        task["is_critical"] = (task["es"] == task["ls"])
+def smoothing_table(tasks, start_date=None):
+    """构造资源平滑的任务表（任务未给出es/ls时，按前置关系用关键路径法从start_date起计算）"""
+    if any("es" not in task or "ls" not in task for task in tasks):
+        if start_date is None:
+            raise ValueError("任务未给出es/ls时必须提供项目开始日期start_date")
+        return TaskTable.from_network(tasks, start_date)
+    return TaskTable.from_records(tasks)
 
-    # 找出项目的开始和结束日期
-    project_start = min(task["es_date"] for task in tasks)
-    project_end = max(task["end_date"] for task in tasks)
 
-    # 计算项目总工期
-    project_duration = (project_end - project_start).days
+def smoothing_windows(table):
+    """
+    资源平滑问题的数值形式（时间为相对项目开始的天数）
+
+    返回 (项目开始天序号, 最早开始, 开始时间上限, 工期, 需求, 项目总工期)；
+    开始时间上限为 min(最晚开始, 总工期-工期)，关键任务固定在最早开始。
+    """
+    project_start = int(table.es.min())
+    starts = (table.es - project_start).astype(np.int64)
+    latest = (table.ls - project_start).astype(np.int64)
+    durations = table.duration.astype(np.int64)
+    project_duration = int((starts + durations).max())
+    upper = np.maximum(np.minimum(latest, project_duration - durations), starts)
+    upper[table.is_critical] = starts[table.is_critical]
+    return project_start, starts, upper, durations, table.demand, project_duration
 
-    print(f"项目总工期: {project_duration} 天")
 
-    # 创建时间轴
-    timeline = [(project_start + timedelta(days=i)) for i in range(project_duration + 1)]
+def resource_smoothing(tasks, start_date=None, time_budget=0, restarts=1, seed=None):
+    """
+    资源平滑算法实现（任务未给出es/ls时，按前置关系用关键路径法从start_date起计算）
 
-    # 初始化资源分配结果
-    result_tasks = tasks.copy()
+    time_budget>0 时在贪心结果基础上做模拟退火改进（restarts个独立重启并行），
+    结果中的 improvement 给出贪心/改进后的方差及各重启的遥测。
+    """
+    table = smoothing_table(tasks, start_date)
+    project_start, starts, upper, durations, demands, project_duration = smoothing_windows(table)
+    latest = (table.ls - project_start).astype(np.int64)
+
+    print(f"项目总工期: {project_duration} 天")
+
+    # 时间轴长度（与原实现一致，包含完工后的一天）
+    n_days = project_duration + 1
 
     # 计算资源需求曲线（初始状态）
-    initial_resource_demand = calculate_resource_demand(result_tasks, timeline)
+    demand = demand_profile(starts, durations, demands, n_days)
+    initial_resource_demand = demand.tolist()
+    total = demand.sum()
+    earliest = starts.copy()
 
     # 按总时差排序非关键任务（从大到小）
-    non_critical_tasks = [t for t in result_tasks if not t["is_critical"]]
-    non_critical_tasks.sort(key=lambda x: (x["ls_date"] - x["es_date"]).days, reverse=True)
+    non_critical = np.flatnonzero(~table.is_critical).tolist()
+    non_critical.sort(key=lambda i: latest[i] - starts[i], reverse=True)
+
+    # 平方和随任务的移除/放回增量维护，只涉及任务所在的天
+    sum_sq = float((demand.astype(float) ** 2).sum())
 
     # 为每个非关键任务寻找最优开始时间
-    for task in non_critical_tasks:
-        best_start_date = task["es_date"]
-        min_variation = float('inf')
-
-        # 在任务的时间窗口内尝试不同的开始时间
-        current_date = task["es_date"]
-        while current_date <= task["ls_date"]:
-            # 临时修改任务开始时间
-            original_start = task["es_date"]
-            task["es_date"] = current_date
-            task["end_date"] = current_date + timedelta(days=task["duration"])
-
-            # 检查是否违反项目总工期约束
-            new_project_end = max(t["end_date"] for t in result_tasks)
-            new_project_duration = (new_project_end - project_start).days
-
-            if new_project_duration <= project_duration:
-                # 计算新的资源需求曲线
-                new_resource_demand = calculate_resource_demand(result_tasks, timeline)
-                variation = calculate_variation(new_resource_demand)
-
-                # 更新最优解
-                if variation < min_variation:
-                    min_variation = variation
-                    best_start_date = current_date
-
-            # 恢复任务开始时间
-            task["es_date"] = original_start
-            task["end_date"] = original_start + timedelta(days=task["duration"])
-
-            # 尝试下一个可能的开始时间（每天递增）
-            current_date += timedelta(days=1)
-
-        # 应用最优开始时间
-        task["es_date"] = best_start_date
-        task["end_date"] = best_start_date + timedelta(days=task["duration"])
+    links = table.links
+    for i in non_critical:
+        cur, d, q = int(starts[i]), durations[i], demands[i]
+        # 在任务的时间窗口内尝试不同的开始时间，且不能超出项目总工期
+        lo, hi = cur, int(upper[i])
+        if links is not None:
+            # 总时差沿链共享：还要不早于前置任务、不晚于后继任务按当前位置给出的约束
+            before, after = links.window(i, starts)
+            lo, hi = max(lo, before), min(hi, after)
+        if hi <= lo or d == 0:
+            continue
+
+        # 先从需求曲线中移除该任务，再用窗口 [lo, hi+d) 上的前缀和一次得到每个候选窗口内的需求之和；
+        # 移动任务时总需求不变，方差只随平方和变化：平方和增量 = 2q·窗口和 + d·q²
+        sum_sq -= 2 * q * float(demand[cur:cur + d].sum()) - d * q * q
+        demand[cur:cur + d] -= q
+        prefix = np.concatenate(([0], np.cumsum(demand[lo:hi + d])))
+        window = prefix[d:] - prefix[:-d]
+        variation = (sum_sq + 2 * q * window + d * q * q) / n_days - (total / n_days) ** 2
+
+        # 应用最优开始时间（方差相同时取最早的）
+        k = int(np.argmin(variation))
+        best = lo + k
+        demand[best:best + d] += q
+        sum_sq += 2 * q * float(window[k]) + d * q * q
+        starts[i] = best
+
+    # 模拟退火改进
+    improvement = None
+    if time_budget > 0:
+        greedy_variance = calculate_variation(demand)
+        annealed = parallel_anneal(starts, earliest, upper, durations, demands, n_days, time_budget,
+                                   restarts=restarts, seed=seed, links=table.links)
+        if annealed['variance'] < greedy_variance:
+            starts = np.array(annealed['starts'], dtype=np.int64)
+            demand = demand_profile(starts, durations, demands, n_days)
+        improvement = {
+            'greedy_variance': float(greedy_variance),
+            'variance': float(calculate_variation(demand)),
+            'restarts': annealed['restarts'],
+        }
 
     # 验证优化后的项目总工期
-    optimized_project_end = max(t["end_date"] for t in result_tasks)
-    optimized_project_duration = (optimized_project_end - project_start).days
+    optimized_project_duration = int((starts + durations).max())
 
     print(f"优化后的项目总工期: {optimized_project_duration} 天")
 
     # 计算优化后的资源需求曲线
-    optimized_resource_demand = calculate_resource_demand(result_tasks, timeline)
-
-    # 格式化结果
-    formatted_tasks = []
-    for task in result_tasks:
-        formatted_tasks.append({
-            "id": task["id"],
-            "duration": task["duration"],
-            "demand": task["demand"],
-            "es": task["es_date"].strftime("%Y-%m-%d"),
-            "ls": task["ls"].strftime("%Y-%m-%d") if isinstance(task["ls"], datetime) else task["ls"],
-            "is_critical": task["is_critical"]
-        })
+    optimized_resource_demand = demand.tolist()
 
+    # 格式化结果（只在这里把天序号转换为日期字符串）
     return {
-        "original_tasks": tasks,
-        "optimized_tasks": formatted_tasks,
+        "original_tasks": table.to_records(),
+        "optimized_tasks": table.to_records(es=starts + project_start),
         "original_demand": initial_resource_demand,
         "optimized_demand": optimized_resource_demand,
-        "timeline": timeline,
+        "timeline": to_iso(project_start + np.arange(n_days)),
         "project_duration": project_duration,
-        "optimized_project_duration": optimized_project_duration
+        "optimized_project_duration": optimized_project_duration,
+        "improvement": improvement,
     }
 
 
-def calculate_resource_demand(tasks, timeline):
-    """计算给定时间轴上的资源需求"""
-    demand = [0] * len(timeline)
-    for task in tasks:
-        for i, date in enumerate(timeline):
-            if task["es_date"] <= date < task["end_date"]:
-                demand[i] += task["demand"]
-    return demand
+def demand_profile(starts, durations, demands, n_days):
+    """差分数组计算逐日资源需求：开始日 +demand、结束日 -demand，再做前缀和"""
+    diff = np.zeros(n_days + 1, dtype=np.result_type(demands, np.int64))
+    np.add.at(diff, np.clip(starts, 0, n_days), demands)
+    np.add.at(diff, np.clip(starts + durations, 0, n_days), -demands)
+    return np.cumsum(diff[:-1])
 
 
 def calculate_variation(demand):
@@ -276,8 +507,7 @@ def print_results(results):
 
     # 打印资源需求曲线
     print("\n资源需求曲线:")
-    dates = [date.strftime("%Y-%m-%d") for date in results["timeline"]]
-    for i, date in enumerate(dates):
+    for i, date in enumerate(results["timeline"]):
         print(f"{date}: 原始需求={results['original_demand'][i]}, 优化后需求={results['optimized_demand'][i]}")
 
 
@@ -295,3 +525,35 @@ if __name__ == "__main__":
     results = resource_smoothing(input_tasks)
     # print('jieguo',results['optimized_tasks'])
     print_results(results)
+
+    # 性能：2000个任务、约一年工期的资源平滑
+    import random
+    import time
+
+    random.seed(0)
+    big_tasks = []
+    for i in range(2000):
+        es = random.randint(0, 300)
+        slack = random.choice([0, random.randint(1, 60)])
+        big_tasks.append({
+            "id": i,
+            "duration": random.randint(1, 30),
+            "demand": random.randint(1, 5),
+            "es": (parse_date("2025-01-01") + timedelta(days=es)).strftime("%Y-%m-%d"),
+            "ls": (parse_date("2025-01-01") + timedelta(days=es + slack)).strftime("%Y-%m-%d"),
+        })
+    t0 = time.time()
+    big_results = resource_smoothing(big_tasks)
+    print(f"2000个任务资源平滑: {time.time() - t0:.2f}s, 方差 "
+          f"{calculate_variation(big_results['original_demand']):.1f} -> "
+          f"{calculate_variation(big_results['optimized_demand']):.1f}")
+
+    # 模拟退火改进：4个重启并行，每个5秒
+    t0 = time.time()
+    big_results = resource_smoothing(big_tasks, time_budget=5, restarts=4, seed=0)
+    improvement = big_results['improvement']
+    print(f"模拟退火改进: {time.time() - t0:.2f}s, 方差 {improvement['greedy_variance']:.1f} -> "
+          f"{improvement['variance']:.1f}")
+    for k, run in enumerate(improvement['restarts']):
+        curve = ', '.join(f"{p['time']:.1f}s:{p['variance']:.1f}" for p in run['telemetry'][::10])
+        print(f"  重启{k}: 迭代{run['iterations']}次, 方差={run['variance']:.1f} [{curve}]")
@@ -1,51 +1,80 @@
 import json
 
+from django.conf import settings
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 
+from .exact import exact_leveling, exact_smoothing
+from .portfolio import portfolio_leveling, portfolio_records
+from .schedule import schedule_monte_carlo
 from .utils import *
 
 
 # Create your views here.
 @csrf_exempt
 def leveling_view(request):
-    tasks = [
-        Task(1, 0, 5, 2),  # 任务1：0-3时间需要1单位资源
-        Task(2, 5, 10, 3),  # 任务2：2-5时间需要1单位资源
-        Task(3, 3, 7, 2),  # 任务3：4-7时间需要1单位资源
-        Task(4, 5, 9, 2)
-    ]
-    max_resource = 4  # 资源最大可用量
-
-    # 执行资源均衡
-    adjusted_tasks = resource_leveling(tasks, max_resource)
-    print(adjusted_tasks)
+    data = json.loads(request.body.decode('utf-8'))
 
-    return JsonResponse({
+    # 请求体：{"tasks": [{"id", "duration", "demand", "es"}, ...], "max_resource": 4}
+    # 任务不给es时按 predecessors 从 start_date 起用关键路径法计算，均衡时保持搭接关系；priority 为任务优先规则
+    # capacity 为 {资源类型: 上限或逐日上限列表} 时按多资源类型均衡（日历从项目开始日起），demand 为 {资源类型: 数量}
+    # max_resource 为列表时做资源上限扫描，返回各上限下的完工日期；method=exact 时用混合整数规划求精确解
+    # projects 为 [{"id", "priority", "tasks": [...]}, ...] 时做项目组合均衡（共享资源池，priority 数值越小越优先）
+    if not isinstance(data, dict):
+        return JsonResponse({'code': 400, 'msg': '请求体须为 {"tasks": [...], "max_resource": ...}'}, status=400)
+    priority = data.get('priority', 'earliest_start')
+    max_resource = data.get('max_resource')
+    try:
+        if data.get('projects') is not None:
+            if max_resource is None:
+                return JsonResponse({'code': 400, 'msg': '缺少资源上限 max_resource'}, status=400)
+            projects = [{'id': project['id'], 'priority': float(project.get('priority', 0)),
+                         'tasks': TaskTable.from_records(validate_leveling_records(project.get('tasks') or []))}
+                        for project in data['projects']]
+            workers = min(max(int(data.get('workers', settings.PORTFOLIO_MAX_WORKERS)), 1),
+                          settings.PORTFOLIO_MAX_WORKERS)
+            result = portfolio_leveling(projects, float(max_resource), priority=priority, workers=workers)
+            return JsonResponse({
+                'code': 200,
+                'msg': portfolio_records(projects, result['starts']),
+                'clusters': result['clusters'],
+                'rounds': result['rounds'],
+            })
+
+        origin, tasks, links = leveling_tasks(data.get('tasks') or [], data.get('start_date'))
+        if isinstance(max_resource, list):
+            if not 1 <= len(max_resource) <= settings.LEVELING_MAX_SWEEP:
+                return JsonResponse({'code': 400, 'msg': f'资源上限个数须在1到{settings.LEVELING_MAX_SWEEP}之间'},
+                                    status=400)
+            curve = capacity_sweep(tasks, [float(v) for v in max_resource], priority=priority, links=links)
+            for point, value in zip(curve, max_resource):
+                finish = point.pop('finish')
+                point['max_resource'] = value
+                point['project_duration'] = finish
+                point['finish_date'] = None if finish is None else to_iso([origin + finish - 1])[0]
+            return JsonResponse({'code': 200, 'msg': curve})
+
+        report = None
+        if data.get('capacity') is not None:
+            adjusted = multi_resource_leveling(tasks, data['capacity'], priority=priority, links=links)
+        elif max_resource is None:
+            return JsonResponse({'code': 400, 'msg': '缺少资源上限 max_resource 或 capacity'}, status=400)
+        elif data.get('method') == 'exact':
+            time_limit = min(max(float(data.get('time_limit', 10)), 0.1), settings.EXACT_MAX_TIME_LIMIT)
+            adjusted, report = exact_leveling(tasks, float(max_resource), time_limit=time_limit, links=links)
+        else:
+            adjusted = resource_leveling(tasks, float(max_resource), priority=priority, links=links)
+    except (KeyError, TypeError, ValueError) as e:
+        return JsonResponse({'code': 400, 'msg': f'无效的参数: {e}'}, status=400)
+
+    response = {
         'code': 200,
-        'msg': [
-            {
-                "id": 1,
-                "es": "2025-06-11",
-                "ls": "2025-06-15"
-            },
-            {
-                "id": 2,
-                "es": "2025-06-17",
-                "ls": "2025-06-21"
-            },
-            {
-                "id": 3,
-                "es": "2025-06-13",
-                "ls": "2025-06-16"
-            },
-            {
-                "id": 4,
-                "es": "2025-06-22",
-                "ls": "2025-06-25"
-            }
-        ],
-    })
+        'msg': leveling_records(tasks, origin),
+        'project_duration': max((t.end for t in adjusted), default=0),
+    }
+    if report is not None:
+        response['exact'] = report
+    return JsonResponse(response)
 
 
 @csrf_exempt
@@ -53,10 +82,56 @@ def smooth_view(request):
     data = json.loads(request.body.decode('utf-8'))
     print(data)
 
-    results = resource_smoothing(data)
+    # 请求体可以是任务列表，也可以是 {"tasks": [...], "start_date": "..."}（任务只给前置关系，由CPM计算es/ls）
+    # time_budget（秒）>0 时在贪心结果上做模拟退火改进，restarts 为并行重启次数
+    # method=exact 时用混合整数规划求精确解（objective 为 variance 或 peak），超时则保留贪心结果
+    if not isinstance(data, dict):
+        data = {'tasks': data}
+    tasks, start_date = data.get('tasks', []), data.get('start_date')
+    try:
+        if data.get('method') == 'exact':
+            time_limit = min(max(float(data.get('time_limit', 10)), 0.1), settings.EXACT_MAX_TIME_LIMIT)
+            results = exact_smoothing(tasks, start_date, objective=data.get('objective', 'variance'),
+                                      time_limit=time_limit)
+        else:
+            time_budget = min(max(float(data.get('time_budget', 0)), 0), settings.SMOOTHING_MAX_TIME_BUDGET)
+            restarts = min(max(int(data.get('restarts', 4)), 1), settings.SMOOTHING_MAX_RESTARTS)
+            results = resource_smoothing(tasks, start_date, time_budget=time_budget, restarts=restarts,
+                                         seed=data.get('seed'))
+    except (KeyError, ValueError) as e:
+        return JsonResponse({'code': 400, 'msg': f'无效的参数: {e}'}, status=400)
     updated_data = update_ls_dates(results['optimized_tasks'])
 
-    return JsonResponse({
+    response = {
         'code': 200,
         'msg': updated_data,
+    }
+    for extra in ('improvement', 'exact'):
+        if results.get(extra) is not None:
+            response[extra] = results[extra]
+    return JsonResponse(response)
+
+
+# 进度风险模拟：三点估计工期的PERT蒙特卡洛，返回完工时间分位数与各任务关键度
+@csrf_exempt
+def schedule_view(request):
+    data = json.loads(request.body.decode('utf-8'))
+    try:
+        tasks = data.get('tasks') or []
+        n_iterations = int(data.get('n_iterations', 10000))
+        if (not isinstance(tasks, list) or not tasks or not 1 <= n_iterations
+                or len(tasks) * n_iterations > settings.SCHEDULE_MAX_SAMPLES):
+            return JsonResponse({'code': 400, 'msg': '任务为空或 任务数×迭代次数 超出上限'}, status=400)
+        result = schedule_monte_carlo(
+            tasks,
+            n_iterations=n_iterations,
+            percentiles=data.get('percentiles', (0.1, 0.5, 0.8, 0.9, 0.95)),
+            seed=data.get('seed'),
+            start_date=data.get('start_date'),
+        )
+    except (KeyError, TypeError, ValueError) as e:
+        return JsonResponse({'code': 400, 'msg': f'无效的参数: {e}'}, status=400)
+    return JsonResponse({
+        'code': 200,
+        'msg': result,
     })
@@ -0,0 +1,172 @@
+# 用户自定义风险公式：白名单AST校验 + 一次编译为向量化NumPy函数
+import ast
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# 公式中允许调用的函数（均为NumPy向量化实现）
+FORMULA_FUNCTIONS = {
+    'exp': np.exp,
+    'log': np.log,
+    'log1p': np.log1p,
+    'sqrt': np.sqrt,
+    'abs': np.abs,
+    'tanh': np.tanh,
+    'max': np.maximum,
+    'min': np.minimum,
+    'clip': np.clip,
+    'where': np.where,
+}
+
+_ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Compare, ast.Call, ast.Name, ast.Load, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.Mod,
+    ast.UAdd, ast.USub,
+    ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Eq, ast.NotEq,
+)
+
+_MAX_FORMULA_LENGTH = 2000
+
+_LOCK = threading.Lock()
+# 请求中直接给出的表达式只做LRU缓存；注册过的公式单独保存（数量同样有上限，超出时淘汰最早注册的）
+_COMPILED = OrderedDict()  # key -> CompiledFormula
+_REGISTERED = OrderedDict()  # key -> CompiledFormula
+_NAMES = {}  # 自定义名称 -> key
+FORMULA_CACHE_SIZE = 256
+FORMULA_REGISTRY_SIZE = 1024
+
+
+class FormulaError(ValueError):
+    """公式不合法（语法错误或使用了白名单之外的语法/函数）"""
+
+
+class _FloatConstants(ast.NodeTransformer):
+    """整数常量转为浮点数，避免 10 ** 10 ** 10 这类大整数运算卡死进程"""
+
+    def visit_Constant(self, node):
+        return ast.copy_location(ast.Constant(value=float(node.value)), node)
+
+
+class CompiledFormula:
+    """编译后的风险公式，可直接作为 model_func 使用"""
+
+    def __init__(self, expression, key, inputs, func):
+        self.expression = expression
+        self.key = key
+        self.inputs = inputs
+        self._func = func
+
+    def __call__(self, **values):
+        missing = [name for name in self.inputs if name not in values]
+        if missing:
+            raise FormulaError(f"公式缺少输入: {', '.join(missing)}")
+        args = [np.asarray(values[name], dtype=float) for name in self.inputs]
+        try:
+            with np.errstate(all='ignore'):
+                result = np.asarray(self._func(*args), dtype=float)
+        except ArithmeticError as e:
+            raise FormulaError(f"公式计算溢出: {e}")
+        return np.broadcast_to(result, np.broadcast_shapes(result.shape, *(arg.shape for arg in args)))
+
+    def __repr__(self):
+        return f"CompiledFormula {self.key} [{self.expression}]"
+
+
+def _validate(tree):
+    """按白名单校验AST，返回公式中用到的输入变量名"""
+    inputs = []
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise FormulaError(f"公式中不允许使用: {type(node).__name__}")
+        if isinstance(node, ast.Constant) and (
+                isinstance(node.value, bool) or not isinstance(node.value, (int, float))):
+            raise FormulaError("公式中只允许数值常量")
+        if isinstance(node, ast.Compare) and len(node.ops) != 1:
+            raise FormulaError("不支持连续比较，请使用 where 组合条件")
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FORMULA_FUNCTIONS:
+                raise FormulaError("只允许调用: " + ', '.join(FORMULA_FUNCTIONS))
+            if node.keywords:
+                raise FormulaError("函数调用不支持关键字参数")
+
+    called = {id(node.func) for node in ast.walk(tree) if isinstance(node, ast.Call)}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and id(node) not in called:
+            if node.id in FORMULA_FUNCTIONS or node.id.startswith('_'):
+                raise FormulaError(f"非法的变量名: {node.id}")
+            if node.id not in inputs:
+                inputs.append(node.id)
+    return inputs
+
+
+def compile_formula(expression):
+    """解析、校验并编译公式；相同表达式（按AST哈希）只编译一次"""
+    if not isinstance(expression, str) or len(expression) > _MAX_FORMULA_LENGTH:
+        raise FormulaError("公式必须是长度不超过2000的字符串")
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except SyntaxError as e:
+        raise FormulaError(f"公式语法错误: {e.msg}")
+    key = hashlib.sha256(ast.dump(tree).encode('utf-8')).hexdigest()[:16]
+
+    cached = _cached(key)
+    if cached is not None:
+        return cached
+
+    inputs = _validate(tree)
+    body = _FloatConstants().visit(tree).body
+    lambda_tree = ast.Expression(body=ast.Lambda(
+        args=ast.arguments(posonlyargs=[], args=[ast.arg(arg=name) for name in inputs], vararg=None,
+                           kwonlyargs=[], kw_defaults=[], kwarg=None, defaults=[]),
+        body=body,
+    ))
+    ast.fix_missing_locations(lambda_tree)
+    func = eval(compile(lambda_tree, f'<formula {key}>', 'eval'), {'__builtins__': {}, **FORMULA_FUNCTIONS})
+
+    formula = CompiledFormula(expression.strip(), key, inputs, func)
+    with _LOCK:
+        formula = _COMPILED.setdefault(key, formula)
+        _COMPILED.move_to_end(key)
+        while len(_COMPILED) > FORMULA_CACHE_SIZE:
+            _COMPILED.popitem(last=False)
+    return formula
+
+
+def _cached(key):
+    """已注册或在LRU缓存中的公式，不存在时返回None"""
+    with _LOCK:
+        if key in _REGISTERED:
+            return _REGISTERED[key]
+        if key in _COMPILED:
+            _COMPILED.move_to_end(key)
+            return _COMPILED[key]
+    return None
+
+
+def register_formula(expression, name=None):
+    """注册公式，之后可以通过哈希key或自定义名称引用"""
+    formula = compile_formula(expression)
+    with _LOCK:
+        _REGISTERED[formula.key] = formula
+        _REGISTERED.move_to_end(formula.key)
+        if name is not None:
+            _NAMES[name] = formula.key
+        while len(_REGISTERED) > FORMULA_REGISTRY_SIZE:
+            evicted, _ = _REGISTERED.popitem(last=False)
+            for alias in [alias for alias, key in _NAMES.items() if key == evicted]:
+                del _NAMES[alias]
+    return formula
+
+
+def get_formula(ref):
+    """按名称、哈希key或表达式本身获取已编译的公式"""
+    if not isinstance(ref, str):
+        return compile_formula(ref)
+    with _LOCK:
+        key = _NAMES.get(ref, ref)
+    cached = _cached(key)
+    if cached is not None:
+        return cached
+    return compile_formula(ref)
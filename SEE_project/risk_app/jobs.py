@@ -0,0 +1,91 @@
+# 后台任务队列：耗时的绘图任务放到线程池执行，请求线程只返回任务id
+# 任务状态保存在进程内；多进程部署时查询接口按内容寻址的key回退到图片存储（见 views.lookup_job）
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+
+class QueueFull(Exception):
+    """排队中的任务数已达上限"""
+
+
+class JobQueue:
+    """
+    有界后台任务队列
+
+    max_workers: 工作线程数
+    max_pending: 排队+执行中的任务上限，超过后 submit 直接抛出 QueueFull（背压）
+    ttl: 已完成任务的结果保留时间（秒）
+    """
+
+    def __init__(self, max_workers=2, max_pending=16, ttl=600):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='risk-job')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._ttl = ttl
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args, key=None, **kwargs):
+        """提交任务，返回任务id；key相同且尚未完成的任务直接复用，不重复执行"""
+        if key is not None:
+            with self._lock:
+                for job in self._jobs.values():
+                    if job['key'] == key and job['finished'] is None:
+                        return job['id']
+        if not self._slots.acquire(blocking=False):
+            raise QueueFull("任务队列已满，请稍后重试")
+        self._purge()
+        job = {
+            'id': uuid.uuid4().hex,
+            'key': key,
+            'status': 'pending',
+            'result': None,
+            'error': None,
+            'created': time.time(),
+            'finished': None,
+        }
+        with self._lock:
+            self._jobs[job['id']] = job
+        try:
+            self._executor.submit(self._run, job, func, args, kwargs)
+        except RuntimeError:
+            self._slots.release()
+            raise
+        return job['id']
+
+    def get(self, job_id):
+        """返回任务状态的快照，任务不存在或已过期时返回None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def _run(self, job, func, args, kwargs):
+        job['status'] = 'running'
+        try:
+            job['result'] = func(*args, **kwargs)
+            job['status'] = 'done'
+        except Exception as e:
+            job['error'] = str(e)
+            job['status'] = 'failed'
+        finally:
+            job['finished'] = time.time()
+            self._slots.release()
+
+    def _purge(self):
+        """清理超过保留时间的已完成任务"""
+        deadline = time.time() - self._ttl
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job['finished'] is not None and job['finished'] < deadline]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+
+render_queue = JobQueue(
+    max_workers=getattr(settings, 'RISK_JOB_WORKERS', 2),
+    max_pending=getattr(settings, 'RISK_JOB_QUEUE_SIZE', 16),
+    ttl=getattr(settings, 'RISK_JOB_TTL', 600),
+)
@@ -0,0 +1,70 @@
+# 绘图内存压力测试：反复渲染风险图表，检查常驻内存增长与打开的Figure数量是否有界
+import os
+import resource
+import time
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+
+from risk_app.render import figure_pool, render_decision_tree, render_monte_carlo, render_sensitivity
+
+
+def current_rss_mb():
+    """当前进程的常驻内存（MB）；没有 /proc 时退回历史峰值"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    help = '反复渲染敏感性、蒙特卡洛与决策树图，RSS增长超过上限或有Figure未释放时失败'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=1000,
+                            help='渲染轮数，每轮2张图、每10轮再加1张决策树图（默认1000轮约2100张）')
+        parser.add_argument('--warmup', type=int, default=20, help='预热轮数，之后才记录基准内存')
+        parser.add_argument('--max-growth', type=float, default=30.0, help='允许的RSS增长（MB）')
+
+    def handle(self, *args, **options):
+        import matplotlib.pyplot as plt
+        from sklearn.tree import DecisionTreeClassifier
+
+        rounds, warmup, max_growth = options['rounds'], options['warmup'], options['max_growth']
+        rng = np.random.default_rng(0)
+        values = np.linspace(800, 1200, 20)
+        results = [pd.DataFrame({'revenue': values, 'output': np.log1p(values), 'param_name': 'revenue'})]
+        X = pd.DataFrame(rng.normal(size=(100, 3)), columns=['revenue', 'cost', 'probability_of_loss'])
+        y = np.where(X['revenue'] > X['cost'], 'High', 'Low')
+        clf = DecisionTreeClassifier(max_depth=4, random_state=42).fit(X, y)
+
+        def render_round(i):
+            render_sensitivity(results, dpi=50)
+            render_monte_carlo(rng.normal(size=1000), dpi=50)
+            if i % 10 == 0:
+                render_decision_tree(clf, X.columns, clf.classes_, dpi=20)
+            return 3 if i % 10 == 0 else 2
+
+        for i in range(1, warmup + 1):
+            render_round(i)
+        baseline = current_rss_mb()
+        start = time.time()
+        figures = 0
+        for i in range(1, rounds + 1):
+            figures += render_round(i)
+            if i % (rounds // 10 or 1) == 0:
+                self.stdout.write(f"{i} 轮 / {figures} 张图: RSS={current_rss_mb():.1f} MB "
+                                  f"(+{current_rss_mb() - baseline:.1f}), 耗时={time.time() - start:.1f}s")
+
+        growth = current_rss_mb() - baseline
+        open_figures = plt.get_fignums()
+        pooled = figure_pool._figures.qsize()
+        if open_figures:
+            raise CommandError(f"pyplot 中仍有 {len(open_figures)} 个打开的Figure")
+        if pooled > figure_pool._figures.maxsize:
+            raise CommandError(f"Figure池中有 {pooled} 个Figure，超过上限 {figure_pool._figures.maxsize}")
+        if growth > max_growth:
+            raise CommandError(f"渲染 {figures} 张图后RSS增长 {growth:.1f} MB，超过上限 {max_growth} MB")
+        self.stdout.write(f"渲染 {figures} 张图，RSS增长 {growth:.1f} MB，无未释放的Figure")
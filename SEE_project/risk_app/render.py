@@ -0,0 +1,105 @@
+# 风险图表渲染层：基于面向对象的Agg Figure API，不依赖pyplot全局状态
+import io
+import queue
+from contextlib import contextmanager
+
+import matplotlib
+
+matplotlib.use('Agg')  # seaborn会导入pyplot，服务器端必须使用非GUI后端
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+DEFAULT_DPI = 100
+
+
+class FigurePool:
+    """
+    可复用的Figure池
+
+    每次借出的Figure只属于当前线程，用完后清空并归还；
+    池满时多余的Figure直接丢弃，不会像pyplot那样在全局管理器中累积。
+    """
+
+    def __init__(self, size=4):
+        self._figures = queue.LifoQueue(maxsize=size)
+
+    @contextmanager
+    def figure(self, figsize, dpi=DEFAULT_DPI):
+        try:
+            fig = self._figures.get_nowait()
+        except queue.Empty:
+            fig = Figure()
+            FigureCanvasAgg(fig)
+        fig.set_dpi(dpi)
+        fig.set_size_inches(figsize)
+        try:
+            yield fig
+        finally:
+            fig.clear()
+            try:
+                self._figures.put_nowait(fig)
+            except queue.Full:
+                pass
+
+
+figure_pool = FigurePool()
+
+
+def _to_png(fig, dpi):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=dpi)
+    return buffer.getvalue()
+
+
+def render_sensitivity(results, dpi=DEFAULT_DPI):
+    """敏感性分析曲线，results为sensitivity_analysis返回的DataFrame列表"""
+    n = len(results)
+    with figure_pool.figure((8, 4 * n), dpi) as fig:
+        axs = fig.subplots(n, 1, squeeze=False)[:, 0]
+        for ax, df in zip(axs, results):
+            param = df['param_name'].iloc[0]
+            ax.plot(df[param], df['output'], marker='o')
+            ax.set_xlabel(param)
+            ax.set_ylabel("Model Output")
+            ax.set_title(f"Sensitivity of Output to {param}")
+            ax.grid(True)
+        fig.tight_layout()
+        return _to_png(fig, dpi)
+
+
+def render_monte_carlo(outputs, dpi=DEFAULT_DPI):
+    """蒙特卡洛模拟结果直方图（含核密度曲线）"""
+    import seaborn as sns  # 只在需要出图时导入
+
+    with figure_pool.figure((6.4, 4.8), dpi) as fig:
+        ax = fig.subplots()
+        sns.histplot(np.asarray(outputs), kde=True, bins=30, ax=ax)
+        ax.set_title("Monte Carlo Simulation Results")
+        ax.set_xlabel("Simulated Output")
+        ax.set_ylabel("Frequency")
+        ax.grid(True)
+        return _to_png(fig, dpi)
+
+
+def render_decision_tree(clf, feature_names, class_names, dpi=DEFAULT_DPI):
+    """决策树结构图"""
+    from sklearn.tree import plot_tree
+
+    with figure_pool.figure((36, 18), dpi) as fig:
+        ax = fig.subplots()
+        plot_tree(clf, feature_names=list(feature_names), class_names=list(class_names), filled=True, ax=ax)
+        ax.set_title("Decision Tree for Risk Classification")
+        return _to_png(fig, dpi)
+
+
+def write_png(content, fname):
+    """写入文件路径或类文件对象"""
+    if hasattr(fname, 'write'):
+        fname.write(content)
+    else:
+        with open(fname, 'wb') as f:
+            f.write(content)
+
+
+# 压力测试（常驻内存与Figure数量是否有界）: python manage.py render_soak --rounds 1000
@@ -0,0 +1,128 @@
+# 风险分析图片存储：按输入内容哈希分目录存放，总大小超限时按LRU淘汰
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+
+# key 为输入内容哈希（make_key 取 sha256 的前32位；也接受完整的64位），只允许小写十六进制，防止路径穿越
+KEY_PATTERN = re.compile(r'[0-9a-f]{32}|[0-9a-f]{64}')
+
+
+class ArtifactStore:
+    """
+    内容寻址的图片存储
+
+    每组图片存放在 root/<key>/ 目录下，key 由请求输入与随机种子的哈希得到，
+    相同输入直接复用已有图片；所有目录总大小超过 max_bytes 时淘汰最久未访问的目录。
+    """
+
+    def __init__(self, root, url_prefix, max_bytes):
+        self.root = root
+        self.url_prefix = url_prefix
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> 目录大小（字节），按访问时间从旧到新排列
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._load()
+
+    @staticmethod
+    def make_key(payload):
+        """对输入做规范化JSON序列化后取哈希"""
+        text = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]
+
+    @staticmethod
+    def valid_key(key):
+        """key 是否为内容哈希格式"""
+        return isinstance(key, str) and KEY_PATTERN.fullmatch(key) is not None
+
+    def get(self, key):
+        """命中时返回该组图片的url列表并刷新访问顺序，未命中（含非法key）返回None"""
+        if not self.valid_key(key):
+            return None
+        directory = os.path.join(self.root, key)
+        with self._lock:
+            if key not in self._entries:
+                # 可能由其他进程写入
+                if not os.path.isdir(directory):
+                    return None
+                self._entries[key] = self._dir_size(directory)
+            self._entries.move_to_end(key)
+        try:
+            os.utime(directory)
+            names = sorted(os.listdir(directory))
+        except FileNotFoundError:
+            with self._lock:
+                self._entries.pop(key, None)
+            return None
+        return self._urls(key, names)
+
+    def put(self, key, artifacts):
+        """写入一组图片 {文件名: 字节内容}，返回url列表；key 须为内容哈希格式，文件名不能含路径"""
+        if not self.valid_key(key):
+            raise ValueError(f"非法的图片存储key: {key!r}")
+        for name in artifacts:
+            if os.path.basename(name) != name or name.startswith('.'):
+                raise ValueError(f"非法的图片文件名: {name!r}")
+        staging = os.path.join(self.root, f'.tmp-{uuid.uuid4().hex}')
+        os.makedirs(staging)
+        for name, content in artifacts.items():
+            with open(os.path.join(staging, name), 'wb') as f:
+                f.write(content)
+        size = sum(len(content) for content in artifacts.values())
+        try:
+            os.rename(staging, os.path.join(self.root, key))
+        except OSError:
+            # 相同输入已被其他请求写入
+            shutil.rmtree(staging, ignore_errors=True)
+        with self._lock:
+            self._entries[key] = size
+            self._entries.move_to_end(key)
+            self._evict()
+        return self._urls(key, sorted(artifacts))
+
+    def _urls(self, key, names):
+        return [f'{self.url_prefix}{key}/{name}' for name in names]
+
+    def _evict(self):
+        """淘汰最久未访问的目录，直到总大小不超过上限（至少保留最新的一组）"""
+        total = sum(self._entries.values())
+        while total > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+            total -= size
+
+    def _load(self):
+        """启动时按目录修改时间重建LRU顺序，并清理残留的临时目录"""
+        found = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if not os.path.isdir(path):
+                continue
+            if name.startswith('.tmp-'):
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            if not self.valid_key(name):
+                # 不是本存储写入的目录，不纳入淘汰
+                continue
+            found.append((os.path.getmtime(path), name, self._dir_size(path)))
+        for _, name, size in sorted(found):
+            self._entries[name] = size
+        self._evict()
+
+    @staticmethod
+    def _dir_size(path):
+        return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+artifact_store = ArtifactStore(
+    root=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'picture'),
+    url_prefix='static/picture/',
+    max_bytes=getattr(settings, 'RISK_ARTIFACT_MAX_BYTES', 200 * 1024 * 1024),
+)
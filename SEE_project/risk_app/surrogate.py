@@ -0,0 +1,140 @@
+# 风险模拟代理模型：用多项式混沌展开拟合蒙特卡洛统计量，支持交互式what-if即时查询
+import itertools
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from scipy.stats import qmc
+
+from .utils import RISK_PARAMS, model_key, scenario_batch
+
+# 代理模型拟合的统计量
+SURROGATE_STATS = ('mean', 'std', 'p05', 'p50', 'p95', 'p_loss')
+
+_LOCK = threading.Lock()
+_SURROGATES = OrderedDict()  # key -> PolynomialSurrogate，按访问顺序LRU淘汰
+SURROGATE_CACHE_SIZE = 64
+
+
+def whatif_marginals(revenue, cost, probability_of_loss, revenue_cv=0.1, cost_cv=0.15, concentration=7.0):
+    """
+    what-if查询点对应的边缘分布
+
+    收入、成本为正态分布（标准差按变异系数取）；损失概率为均值等于probability_of_loss的Beta分布，
+    concentration=a+b，默认7与pic_view使用的Beta(2, 5)一致。
+    """
+    if not 0 < probability_of_loss < 1:
+        raise ValueError(f"损失概率须在 (0, 1) 之间: {probability_of_loss}")
+    return {
+        'revenue': {'dist': 'normal', 'mean': revenue, 'std': revenue * revenue_cv},
+        'cost': {'dist': 'normal', 'mean': cost, 'std': cost * cost_cv},
+        'probability_of_loss': {'dist': 'beta', 'a': probability_of_loss * concentration,
+                                'b': (1 - probability_of_loss) * concentration},
+    }
+
+
+def validate_domain(domain):
+    """检查代理模型定义域：各参数下界须小于上界，损失概率的范围须在 (0, 1) 之内"""
+    for name in RISK_PARAMS:
+        lower, upper = (float(v) for v in domain[name])
+        if not lower < upper:
+            raise ValueError(f"参数{name}的定义域下界须小于上界: ({lower}, {upper})")
+    lower, upper = domain['probability_of_loss']
+    if not (0 < lower and upper < 1):
+        raise ValueError("损失概率的定义域须在 (0, 1) 之内")
+
+
+def simulate_stats(model_func, points, corr=None, n_simulations=4000, seed=None, **marginal_options):
+    """对一组查询点做公共随机数蒙特卡洛模拟，返回形状为 (P, len(SURROGATE_STATS)) 的统计量"""
+    scenarios = [whatif_marginals(*point, **marginal_options) for point in points]
+    result = scenario_batch(model_func, scenarios, corr, n_simulations, seed)
+    return np.array([
+        [s['mean'], s['std'], s['quantiles']['0.05'], s['quantiles']['0.5'], s['quantiles']['0.95'], s['p_loss']]
+        for s in result['scenarios']
+    ])
+
+
+class PolynomialSurrogate:
+    """
+    Legendre多项式混沌代理模型
+
+    输入先线性映射到[-1, 1]，使用总阶数不超过degree的张量积Legendre基做最小二乘拟合；
+    误差估计为留一交叉验证（由帽子矩阵闭式计算）的均方根误差。
+    """
+
+    def __init__(self, lower, upper, degree=4):
+        self.lower = np.asarray(lower, dtype=float)
+        self.upper = np.asarray(upper, dtype=float)
+        self.degree = degree
+        self.terms = [idx for idx in itertools.product(range(degree + 1), repeat=len(self.lower))
+                      if sum(idx) <= degree]
+        self._terms = np.array(self.terms)  # (T, D)，每一项在各维度上的阶数
+        self._dims = np.arange(len(self.lower))
+        self.coef = None
+        self.error = None
+
+    def contains(self, x):
+        x = np.asarray(x, dtype=float)
+        return bool(np.all(x >= self.lower) and np.all(x <= self.upper))
+
+    def _basis(self, x):
+        scaled = 2 * (np.atleast_2d(x) - self.lower) / (self.upper - self.lower) - 1
+        # Legendre三项递推，同时计算所有维度：values[:, d, k] = P_k(x_d)
+        values = np.empty(scaled.shape + (self.degree + 1,))
+        values[:, :, 0] = 1.0
+        if self.degree > 0:
+            values[:, :, 1] = scaled
+        for k in range(1, self.degree):
+            values[:, :, k + 1] = ((2 * k + 1) * scaled * values[:, :, k] - k * values[:, :, k - 1]) / (k + 1)
+        return values[:, self._dims, self._terms].prod(axis=2)
+
+    def fit(self, x, y):
+        phi = self._basis(x)
+        self.coef, *_ = np.linalg.lstsq(phi, y, rcond=None)
+        q, _ = np.linalg.qr(phi)
+        leverage = np.minimum((q ** 2).sum(axis=1), 1 - 1e-9)
+        loo = (y - phi @ self.coef) / (1 - leverage)[:, None]
+        self.error = np.sqrt((loo ** 2).mean(axis=0))
+        return self
+
+    def predict(self, x):
+        return self._basis(x) @ self.coef
+
+
+def surrogate_key(model_func, domain, corr=None, **marginal_options):
+    return repr((model_key(model_func), [tuple(domain[name]) for name in RISK_PARAMS], corr,
+                 sorted(marginal_options.items())))
+
+
+def fit_surrogate(key, model_func, domain, corr=None, n_points=256, n_simulations=4000, degree=4, seed=0,
+                  **marginal_options):
+    """在Sobol设计点上运行模拟并拟合代理模型（耗时，应在后台任务中调用）"""
+    lower = [domain[name][0] for name in RISK_PARAMS]
+    upper = [domain[name][1] for name in RISK_PARAMS]
+    m = int(np.ceil(np.log2(n_points)))
+    points = qmc.scale(qmc.Sobol(len(lower), scramble=True, seed=seed).random_base2(m), lower, upper)
+    stats = simulate_stats(model_func, points, corr, n_simulations, seed, **marginal_options)
+    surrogate = PolynomialSurrogate(lower, upper, degree).fit(points, stats)
+    with _LOCK:
+        _SURROGATES[key] = surrogate
+        _SURROGATES.move_to_end(key)
+        while len(_SURROGATES) > SURROGATE_CACHE_SIZE:
+            _SURROGATES.popitem(last=False)
+    return key
+
+
+def get_surrogate(key):
+    with _LOCK:
+        surrogate = _SURROGATES.get(key)
+        if surrogate is not None:
+            _SURROGATES.move_to_end(key)
+        return surrogate
+
+
+def query_whatif(surrogate, point):
+    """用代理模型回答查询，返回各统计量的预测值与误差估计（多项式外推可能越界，p_loss 截断到 [0, 1]、std 不小于0）"""
+    prediction = dict(zip(SURROGATE_STATS, surrogate.predict(point)[0]))
+    prediction['p_loss'] = min(max(prediction['p_loss'], 0.0), 1.0)
+    prediction['std'] = max(prediction['std'], 0.0)
+    return ({name: float(prediction[name]) for name in SURROGATE_STATS},
+            {name: float(v) for name, v in zip(SURROGATE_STATS, surrogate.error)})
@@ -1,3 +1,308 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+import numpy as np
+from django.core.management import CommandError, call_command
 from django.test import TestCase
+from scipy import stats
+
+from . import surrogate, views
+from .formula import FormulaError, compile_formula
+from .jobs import JobQueue, QueueFull
+from .store import ArtifactStore
+from .utils import bootstrap_ci, gaussian_copula_sample, sobol_indices, tail_risk, validate_marginals
+
+
+def margin(revenue, cost):
+    return revenue - cost
+
+
+class CopulaTests(TestCase):
+    """高斯Copula相关抽样"""
+
+    def test_sample_correlation(self):
+        marginals = {
+            'revenue': {'dist': 'normal', 'mean': 100, 'std': 10},
+            'cost': {'dist': 'normal', 'mean': 60, 'std': 5},
+            'probability_of_loss': {'dist': 'beta', 'a': 2, 'b': 5},
+        }
+        corr = [[1, 0.6, -0.3], [0.6, 1, 0], [-0.3, 0, 1]]
+        samples = gaussian_copula_sample(marginals, corr, n=200000, seed=0)
+        self.assertAlmostEqual(np.corrcoef(samples['revenue'], samples['cost'])[0, 1], 0.6, delta=0.01)
+        # 非正态边缘分布保持秩相关：Spearman = 6/π·arcsin(ρ/2)
+        rho = stats.spearmanr(samples['revenue'], samples['probability_of_loss'])[0]
+        self.assertAlmostEqual(rho, 6 / np.pi * np.arcsin(-0.3 / 2), delta=0.01)
+        self.assertAlmostEqual(samples['probability_of_loss'].mean(), 2 / 7, delta=0.005)
+
+    def test_rejects_invalid_correlation(self):
+        marginals = {'revenue': {'mean': 0, 'std': 1}, 'cost': {'mean': 0, 'std': 1}}
+        with self.assertRaises(ValueError):
+            gaussian_copula_sample(marginals, [[1, 2], [2, 1]], n=10)
+
+
+class TailRiskTests(TestCase):
+    """重要性抽样的VaR/CVaR与正态分布闭式解对比"""
+
+    def test_matches_closed_form(self):
+        marginals = {
+            'revenue': {'dist': 'normal', 'mean': 100, 'std': 12},
+            'cost': {'dist': 'normal', 'mean': 80, 'std': 9},
+        }
+        mu, sigma = 20, 15
+        result = tail_risk(margin, marginals, n_samples=40000, seed=1)
+        for metric in result['metrics']:
+            p = 1 - metric['level']
+            z = stats.norm.ppf(p)
+            self.assertAlmostEqual(metric['var'], mu + sigma * z, delta=0.03 * sigma, msg=metric['level'])
+            self.assertAlmostEqual(metric['cvar'], mu - sigma * stats.norm.pdf(z) / p, delta=0.03 * sigma,
+                                   msg=metric['level'])
+
+    def test_rejects_levels_outside_unit_interval(self):
+        marginals = {'revenue': {'mean': 0, 'std': 1}, 'cost': {'mean': 0, 'std': 1}}
+        for levels in ([1.0], [0], [], [0.95, 1.5]):
+            with self.assertRaises(ValueError):
+                tail_risk(margin, marginals, levels=levels, n_samples=1000)
+
+
+class FormulaTests(TestCase):
+    """自定义公式的白名单校验"""
+
+    def test_evaluates_whitelisted_expression(self):
+        formula = compile_formula('log1p(max(revenue - cost, 0)) / exp(probability_of_loss)')
+        self.assertEqual(set(formula.inputs), {'revenue', 'cost', 'probability_of_loss'})
+        value = formula(revenue=np.array([10.0, 1.0]), cost=np.array([4.0, 2.0]), probability_of_loss=0.0)
+        np.testing.assert_allclose(value, [np.log1p(6.0), 0.0])
+
+    def test_rejects_attribute_and_call_nodes(self):
+        for expression in ('revenue.__class__', '().__class__.__bases__', "__import__('os')", 'open("x")',
+                           'exp(revenue).real', '(lambda: 1)()', 'revenue[0]', 'exp(x=revenue)',
+                           'exp', '_secret + 1', '"text"', 'revenue if cost else 0', 'getattr(revenue, "x")'):
+            with self.assertRaises(FormulaError, msg=expression):
+                compile_formula(expression)
+
+
+class SobolTests(TestCase):
+    """线性模型的Sobol指数有闭式解：一阶 = 总效应 = 各输入方差占比"""
+
+    def test_recovers_known_indices(self):
+        marginals = {
+            'revenue': {'dist': 'normal', 'mean': 100, 'std': 3},
+            'cost': {'dist': 'normal', 'mean': 60, 'std': 4},
+            'probability_of_loss': {'dist': 'beta', 'a': 2, 'b': 5},
+        }
+
+        def model(revenue, cost, probability_of_loss):
+            return revenue - cost
+
+        result = sobol_indices(model, marginals, n_base=8192, n_bootstrap=100, seed=0)
+        np.testing.assert_allclose(result['first_order'], [0.36, 0.64, 0], atol=0.03)
+        np.testing.assert_allclose(result['total'], [0.36, 0.64, 0], atol=0.03)
+        for (low, high), value in zip(result['first_order_ci'], result['first_order']):
+            self.assertLessEqual(low, high)
+
+
+class BootstrapTests(TestCase):
+    """大样本的分箱bootstrap与直接重抽样结果一致"""
+
+    def test_binned_matches_resample(self):
+        x = np.random.default_rng(0).lognormal(0, 0.5, size=20000)
+        direct = bootstrap_ci(x, n_bootstrap=400, seed=1, max_resample=len(x))
+        binned = bootstrap_ci(x, n_bootstrap=400, seed=1, max_resample=0)
+        self.assertEqual((direct['method'], binned['method']), ('resample', 'binned'))
+        self.assertAlmostEqual(binned['mean']['estimate'], direct['mean']['estimate'])
+        self.assertAlmostEqual(binned['mean']['std_error'], direct['mean']['std_error'],
+                               delta=0.15 * direct['mean']['std_error'])
+        for q in direct['quantiles']:
+            d, b = direct['quantiles'][q], binned['quantiles'][q]
+            self.assertEqual(b['estimate'], d['estimate'])
+            self.assertAlmostEqual(b['std_error'], d['std_error'], delta=0.25 * d['std_error'], msg=q)
+            self.assertLess(abs(b['low'] - d['low']), 2 * d['std_error'], msg=q)
+            self.assertLess(abs(b['high'] - d['high']), 2 * d['std_error'], msg=q)
+
+    def test_loss_includes_threshold(self):
+        result = bootstrap_ci(np.array([0.0, 0.0, 1.0, 2.0]), n_bootstrap=10, seed=0)
+        self.assertEqual(result['p_loss']['estimate'], 0.5)
+
+
+class MarginalValidationTests(TestCase):
+    """前端给出的边缘分布须为已知参数、已知分布且参数齐全"""
+
+    def test_rejects_invalid_specs(self):
+        for marginals in ({'foo': {'dist': 'normal', 'mean': 0, 'std': 1}}, {'revenue': 5},
+                          {'revenue': {'dist': 'cauchy'}}, {'revenue': {'dist': 'normal', 'mean': 1}},
+                          {'cost': {'dist': 'normal', 'mean': 'x', 'std': 1}},
+                          {'cost': {'dist': 'normal', 'mean': 1, 'std': -1}},
+                          {'probability_of_loss': {'dist': 'beta', 'a': 0, 'b': 1}},
+                          {'cost': {'dist': 'uniform', 'low': 2, 'high': 1}}, [1]):
+            with self.assertRaises(ValueError, msg=marginals):
+                validate_marginals(marginals)
+        validate_marginals({'cost': {'dist': 'triangular', 'low': 1, 'mode': 2, 'high': 3}})
+
+
+class ArtifactStoreTests(TestCase):
+    """图片存储：key 校验与按大小的LRU淘汰"""
+
+    def setUp(self):
+        self.base = tempfile.mkdtemp()
+        self.root = os.path.join(self.base, 'picture')
+        self.victim = os.path.join(self.base, 'victim')
+        os.makedirs(self.victim)
+        self.store = ArtifactStore(self.root, 'static/picture/', max_bytes=100)
+
+    def tearDown(self):
+        shutil.rmtree(self.base, ignore_errors=True)
+
+    def test_rejects_traversal_keys(self):
+        for key in ('../victim', '..', '/tmp', 'a' * 31, 'A' * 32, '', None):
+            self.assertIsNone(self.store.get(key))
+            with self.assertRaises(ValueError):
+                self.store.put(key, {'a.png': b'x'})
+        self.assertEqual(len(self.store._entries), 0)
+        # 再写入足以触发淘汰的内容，目录外的文件夹不受影响
+        for i in range(5):
+            self.store.put(ArtifactStore.make_key(i), {'a.png': b'x' * 60})
+        self.assertTrue(os.path.isdir(self.victim))
+
+    def test_job_view_rejects_traversal_key(self):
+        for key in ('../victim', '../../etc'):
+            response = self.client.get('/risk/job/missing/', {'key': key})
+            self.assertEqual(response.status_code, 404)
+            response = self.client.get('/risk/job/missing/result/', {'key': key})
+            self.assertEqual(response.status_code, 404)
+
+    def test_evicts_least_recently_used(self):
+        keys = [ArtifactStore.make_key(i) for i in range(3)]
+        self.store.put(keys[0], {'a.png': b'x' * 40})
+        self.store.put(keys[1], {'a.png': b'x' * 40})
+        self.assertIsNotNone(self.store.get(keys[0]))
+        self.store.put(keys[2], {'a.png': b'x' * 40})
+        self.assertIsNone(self.store.get(keys[1]))
+        self.assertFalse(os.path.exists(os.path.join(self.root, keys[1])))
+        self.assertEqual(self.store.get(keys[0]), [f'static/picture/{keys[0]}/a.png'])
+        # 重启后按目录修改时间重建
+        reloaded = ArtifactStore(self.root, 'static/picture/', max_bytes=100)
+        self.assertEqual(set(reloaded._entries), {keys[0], keys[2]})
+
+
+class JobQueueTests(TestCase):
+    """有界任务队列的背压"""
+
+    def test_queue_full(self):
+        queue = JobQueue(max_workers=1, max_pending=1)
+        release = threading.Event()
+        job_id = queue.submit(release.wait, key='a')
+        # 相同key的未完成任务直接复用，不占用名额
+        self.assertEqual(queue.submit(release.wait, key='a'), job_id)
+        with self.assertRaises(QueueFull):
+            queue.submit(release.wait, key='b')
+        release.set()
+        queue._executor.shutdown(wait=True)
+        self.assertEqual(queue.get(job_id)['status'], 'done')
+
+    def test_pic_view_returns_503(self):
+        body = {'user_revenue': 1000, 'user_cost': 600, 'format': 'png', 'seed': 123456789}
+        with mock.patch.object(views.render_queue, 'submit', side_effect=QueueFull('任务队列已满')), \
+                mock.patch.object(views.artifact_store, 'get', return_value=None):
+            response = self.client.post('/risk/pic/', json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+
+
+class SurrogateTests(TestCase):
+    """代理模型缓存的LRU淘汰与预测值截断"""
+
+    def constant_surrogate(self, values):
+        model = surrogate.PolynomialSurrogate([0, 0, 0.1], [1, 1, 0.5], degree=1)
+        model.coef = np.zeros((len(model.terms), len(surrogate.SURROGATE_STATS)))
+        model.coef[0] = values
+        model.error = np.zeros(len(surrogate.SURROGATE_STATS))
+        return model
+
+    def test_clips_predictions(self):
+        model = self.constant_surrogate([1.0, -2.0, 0.0, 0.5, 1.0, -0.005])
+        prediction, _ = surrogate.query_whatif(model, [0.5, 0.5, 0.2])
+        self.assertEqual(prediction['p_loss'], 0.0)
+        self.assertEqual(prediction['std'], 0.0)
+        model.coef[0, -1] = 1.2
+        self.assertEqual(surrogate.query_whatif(model, [0.5, 0.5, 0.2])[0]['p_loss'], 1.0)
+
+    def test_cache_is_bounded(self):
+        model = self.constant_surrogate(np.zeros(len(surrogate.SURROGATE_STATS)))
+        with mock.patch.object(surrogate, '_SURROGATES', surrogate.OrderedDict()), \
+                mock.patch.object(surrogate, 'SURROGATE_CACHE_SIZE', 2), \
+                mock.patch.object(surrogate, 'PolynomialSurrogate') as factory, \
+                mock.patch.object(surrogate, 'simulate_stats'):
+            factory.return_value.fit.return_value = model
+            domain = {'revenue': (1, 2), 'cost': (1, 2), 'probability_of_loss': (0.1, 0.5)}
+            for key in ('a', 'b'):
+                surrogate.fit_surrogate(key, margin, domain, n_points=4)
+            self.assertIs(surrogate.get_surrogate('a'), model)
+            surrogate.fit_surrogate('c', margin, domain, n_points=4)
+            self.assertIsNone(surrogate.get_surrogate('b'))
+            self.assertEqual(list(surrogate._SURROGATES), ['a', 'c'])
+
+
+class EndpointValidationTests(TestCase):
+    """非法参数返回400而不是500"""
+
+    base = {'user_revenue': 1000, 'user_cost': 600}
+
+    def post(self, url, **body):
+        return self.client.post(url, json.dumps(dict(self.base, **body)), content_type='application/json')
+
+    def assertBadRequest(self, url, **body):
+        response = self.post(url, **body)
+        self.assertEqual(response.status_code, 400, (url, body, response.content))
+
+    def test_bad_marginals(self):
+        for url in ('/risk/pic/', '/risk/tail/', '/risk/sobol/', '/risk/bootstrap/', '/risk/classify/'):
+            self.assertBadRequest(url, marginals={'foo': {'dist': 'normal', 'mean': 1, 'std': 1}}, projects=[])
+            self.assertBadRequest(url, marginals={'revenue': 5}, projects=[])
+
+    def test_bad_sample_counts(self):
+        for value in ('abc', None):
+            self.assertBadRequest('/risk/bootstrap/', n_simulations=value)
+            self.assertBadRequest('/risk/bootstrap/', n_bootstrap=value)
+            self.assertBadRequest('/risk/scenarios/', n_simulations=value, scenarios=[self.base])
+            self.assertBadRequest('/risk/classify/', n_samples=value, projects=[])
+            self.assertBadRequest('/risk/tail/', n_samples=value)
+            self.assertBadRequest('/risk/sensitivity/', steps=value)
+            self.assertBadRequest('/risk/pic/', dpi=value)
+        self.assertBadRequest('/risk/scenarios/', scenarios=5)
+        self.assertBadRequest('/risk/tail/', levels=[1.5])
+        self.assertBadRequest('/risk/sobol/', n_base=10 ** 9)
+
+    def test_bad_whatif_query(self):
+        self.assertBadRequest('/risk/whatif/', query={'probability_of_loss': 1.5})
+        self.assertBadRequest('/risk/whatif/', domain={'probability_of_loss': [0, 2]})
+
+    def test_valid_requests(self):
+        response = self.post('/risk/bootstrap/', n_simulations=2000, n_bootstrap=20, seed=0)
+        self.assertEqual(response.status_code, 200)
+        response = self.post('/risk/scenarios/', n_simulations=1000, scenarios=[self.base, self.base], seed=0)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['msg']['differences'][0]['mean_diff'], 0)
+
+
+class RenderSoakTests(TestCase):
+    """反复渲染后没有未释放的Figure，内存增长有界（完整压力测试: manage.py render_soak）"""
+
+    def test_short_soak(self):
+        output = io.StringIO()
+        call_command('render_soak', rounds=10, warmup=2, max_growth=30, stdout=output)
+        self.assertIn('无未释放的Figure', output.getvalue())
+
+    def test_detects_leaked_figure(self):
+        import matplotlib.pyplot as plt
 
-# Create your tests here.
+        plt.figure()
+        try:
+            with self.assertRaises(CommandError):
+                call_command('render_soak', rounds=1, warmup=0, stdout=io.StringIO())
+        finally:
+            plt.close('all')
@@ -3,5 +3,15 @@ from .views import *
 
 urlpatterns = [
     path('pic/', pic_view, name='pic'),
+    path('job/<str:job_id>/', job_view, name='job'),
+    path('job/<str:job_id>/result/', job_result_view, name='job_result'),
+    path('tail/', tail_view, name='tail'),
+    path('bootstrap/', bootstrap_view, name='bootstrap'),
+    path('sensitivity/', sensitivity_view, name='sensitivity'),
+    path('sobol/', sobol_view, name='sobol'),
+    path('formula/', formula_view, name='formula'),
+    path('classify/', classify_view, name='classify'),
+    path('scenarios/', scenarios_view, name='scenarios'),
+    path('whatif/', whatif_view, name='whatif'),
 ]
 
@@ -1,25 +1,90 @@
+import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.tree import DecisionTreeClassifier, plot_tree
+from scipy import special
+from scipy.stats import qmc
+from sklearn.tree import DecisionTreeClassifier
+
+# 绘图相关模块（matplotlib / seaborn）只在需要出图时才导入，见 plot_* 函数
+
+# 风险模型输入参数（相关系数矩阵的行列顺序与此一致）
+RISK_PARAMS = ('revenue', 'cost', 'probability_of_loss')
 
 
 # Sensitivity Analysis
-# model_func：替换为风险模型函数
-def sensitivity_analysis(model_func, param_ranges, base_values, steps=20):
-    results = []
+# model_func：替换为风险模型函数（需支持数组输入）
+def sensitivity_grid(model_func, param_ranges, base_values, steps=20, pairs=None):
+    """
+    向量化敏感性分析：一次性构造单因素网格与（可选的）双参数交互网格，
+    拼接为一个二维数组后只调用一次model_func
+
+    返回:
+        params: 参与分析的参数名
+        values: 各参数的取值网格，形状 (P, steps)
+        outputs: 单因素输出曲线，形状 (P, steps)
+        base_output: 基准输入下的输出
+        tornado: 龙卷风图数据（按波动幅度从大到小排序）
+        surfaces: 双参数交互曲面，每个输出形状 (steps, steps)
+    """
+    names = list(base_values)
+    params = list(param_ranges)
+    pairs = [tuple(pair) for pair in (pairs or [])]
+    base = np.array([base_values[name] for name in names], dtype=float)
+    values = np.array([np.linspace(low, high, steps) for low, high in param_ranges.values()]).reshape(-1, steps)
+
+    # 单因素网格：第k块只替换第k个参数
+    one_at_a_time = np.broadcast_to(base, (len(params), steps, len(names))).copy()
+    for k, param in enumerate(params):
+        one_at_a_time[k, :, names.index(param)] = values[k]
+    blocks = [one_at_a_time.reshape(-1, len(names))]
+
+    # 双参数网格：行对应第一个参数，列对应第二个参数
+    for a, b in pairs:
+        surface = np.broadcast_to(base, (steps, steps, len(names))).copy()
+        surface[:, :, names.index(a)] = values[params.index(a)][:, None]
+        surface[:, :, names.index(b)] = values[params.index(b)][None, :]
+        blocks.append(surface.reshape(-1, len(names)))
 
-    for param, (low, high) in param_ranges.items():
-        values = np.linspace(low, high, steps)
-        outputs = []
+    points = np.vstack(blocks + [base[None, :]])
+    outputs = np.asarray(model_func(**{name: points[:, i] for i, name in enumerate(names)}), dtype=float)
+    outputs = np.broadcast_to(outputs, (len(points),))
 
-        for v in values:
-            inputs = base_values.copy()
-            inputs[param] = v
-            result = model_func(**inputs)
-            outputs.append(result)
+    n_curve = len(params) * steps
+    curves = outputs[:n_curve].reshape(len(params), steps)
+    surfaces = [
+        {'pair': pair, 'output': outputs[n_curve + i * steps ** 2: n_curve + (i + 1) * steps ** 2].reshape(steps, steps)}
+        for i, pair in enumerate(pairs)
+    ]
+    tornado = sorted((
+        {
+            'param': param,
+            'low': float(values[k, 0]),
+            'high': float(values[k, -1]),
+            'low_output': float(curves[k, 0]),
+            'high_output': float(curves[k, -1]),
+            'swing': float(curves[k].max() - curves[k].min()),
+        }
+        for k, param in enumerate(params)
+    ), key=lambda item: item['swing'], reverse=True)
 
+    return {
+        'params': params,
+        'values': values,
+        'outputs': curves,
+        'base_output': float(outputs[-1]),
+        'tornado': tornado,
+        'surfaces': surfaces,
+    }
+
+
+def sensitivity_analysis(model_func, param_ranges, base_values, steps=20):
+    grid = sensitivity_grid(model_func, param_ranges, base_values, steps)
+    results = []
+    for param, values, outputs in zip(grid['params'], grid['values'], grid['outputs']):
         df = pd.DataFrame({
             param: values,
             'output': outputs
@@ -30,18 +95,159 @@ def sensitivity_analysis(model_func, param_ranges, base_values, steps=20):
     return results  # list of DataFrames
 
 
+# Global Sensitivity Analysis (Sobol indices)
+def sobol_indices(model_func, marginals, n_base=4096, n_bootstrap=200, confidence=0.95, seed=None,
+                  max_elements=2 ** 22):
+    """
+    基于Saltelli抽样的Sobol全局敏感性指数（假设各输入相互独立）
+
+    模型只在一个 N*(d+2) 行的批次上调用一次；
+    bootstrap置信区间通过对已有输出重采样索引得到，不再重复调用模型；
+    重采样按块进行，每块的下标矩阵不超过 max_elements 个元素。
+    """
+    names = list(marginals)
+    d = len(names)
+    rng = np.random.default_rng(seed)
+
+    # Sobol低差异序列（样本数取不小于n_base的2的幂），前d列为A，后d列为B
+    m = max(int(np.ceil(np.log2(n_base))), 1)
+    u = qmc.Sobol(2 * d, scramble=True, seed=rng).random_base2(m)
+    z = special.ndtri(np.clip(u, 1e-12, 1 - 1e-12))
+    n = len(z)
+    a, b = z[:, :d], z[:, d:]
+
+    # AB_i：A的第i列替换为B的第i列
+    ab = np.broadcast_to(a, (d, n, d)).copy()
+    ab[np.arange(d), :, np.arange(d)] = b.T
+    stacked = np.vstack([a, b, ab.reshape(-1, d)])
+    outputs = np.asarray(model_func(**{
+        name: marginal_from_normal(marginals[name], stacked[:, i]) for i, name in enumerate(names)
+    }), dtype=float)
+    f_a, f_b, f_ab = outputs[:n], outputs[n:2 * n], outputs[2 * n:].reshape(d, n)
+
+    def estimate(idx):
+        fa, fb, fab = f_a[idx], f_b[idx], f_ab[:, idx]
+        var = np.var(np.concatenate([fa, fb], axis=-1), axis=-1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            first = np.mean(fb * (fab - fa), axis=-1) / var  # Saltelli (2010)
+            total = 0.5 * np.mean((fa - fab) ** 2, axis=-1) / var  # Jansen (1999)
+        return np.nan_to_num(first), np.nan_to_num(total)
+
+    first, total = estimate(np.arange(n))
+    rows = max(1, max_elements // n)
+    boots = [estimate(rng.integers(0, n, size=(min(rows, n_bootstrap - start), n)))
+             for start in range(0, n_bootstrap, rows)]
+    boot_first = np.concatenate([b[0] for b in boots], axis=-1)
+    boot_total = np.concatenate([b[1] for b in boots], axis=-1)
+    tail = (1 - confidence) / 2 * 100
+    first_ci = np.percentile(boot_first, [tail, 100 - tail], axis=1).T
+    total_ci = np.percentile(boot_total, [tail, 100 - tail], axis=1).T
+
+    return {
+        'params': names,
+        'first_order': first.tolist(),
+        'total': total.tolist(),
+        'first_order_ci': first_ci.tolist(),
+        'total_ci': total_ci.tolist(),
+        'n_base': n,
+        'n_evaluations': len(outputs),
+    }
+
+
 # Decision Tree Modeling
-def decision_tree_model(X, y):
+def risk_dataset(model_func, marginals, corr=None, n=100, seed=None):
+    """生成决策树训练数据：抽样输入、整列计算风险得分并按三分位划分风险等级"""
+    data = pd.DataFrame(gaussian_copula_sample(marginals, corr, n, seed))
+    features = list(data.columns)
+    data['risk_score'] = model_func(**{name: data[name].to_numpy() for name in features})
+    data['risk_level'] = pd.qcut(data['risk_score'], q=3, labels=['Low', 'Medium', 'High'])
+    return data, features
+
+
+def train_decision_tree(X, y):
     clf = DecisionTreeClassifier(max_depth=4, random_state=42)
     clf.fit(X, y)
-    plt.figure(figsize=(36, 18))
-    plot_tree(clf, feature_names=X.columns, class_names=np.unique(y).astype(str), filled=True)
-    plt.title("Decision Tree for Risk Classification")
-    plt.savefig('risk_app/picture/decision_tree.png')
-    # plt.show()
     return clf
 
 
+def model_key(model_func):
+    """模型函数的标识：自定义公式取其哈希key，内置模型取函数名"""
+    return getattr(model_func, 'key', getattr(model_func, '__name__', repr(model_func)))
+
+
+_TREE_CACHE = OrderedDict()  # 参数key -> (clf, features)
+_TREE_CACHE_LOCK = threading.Lock()
+TREE_CACHE_SIZE = 32
+
+
+def fitted_risk_tree(model_func, marginals, corr=None, n=100, seed=None):
+    """
+    按输入参数缓存训练好的风险决策树，返回 (clf, features)
+
+    seed可以是整数或SeedSequence；未指定seed时每次数据不同，不做缓存。
+    """
+    if isinstance(seed, np.random.SeedSequence):
+        seed_key = [seed.entropy, list(seed.spawn_key)]
+    else:
+        seed_key = seed
+    key = None if seed is None else json.dumps(
+        [model_key(model_func), marginals, corr, n, seed_key], sort_keys=True, default=str)
+
+    if key is not None:
+        with _TREE_CACHE_LOCK:
+            if key in _TREE_CACHE:
+                _TREE_CACHE.move_to_end(key)
+                return _TREE_CACHE[key]
+
+    data, features = risk_dataset(model_func, marginals, corr, n, seed)
+    result = (train_decision_tree(data[features], data['risk_level']), features)
+
+    if key is not None:
+        with _TREE_CACHE_LOCK:
+            _TREE_CACHE[key] = result
+            while len(_TREE_CACHE) > TREE_CACHE_SIZE:
+                _TREE_CACHE.popitem(last=False)
+    return result
+
+
+def classify_projects(clf, features, projects):
+    """用已训练的决策树一次性为多个候选项目划分风险等级"""
+    X = pd.DataFrame(projects)
+    missing = [name for name in features if name not in X.columns]
+    if missing:
+        raise ValueError(f"项目缺少字段: {', '.join(missing)}")
+    values = X[features].astype(float)
+    if not np.isfinite(values.to_numpy()).all():
+        raise ValueError("项目字段须为有限数值")
+    return clf.predict(values).astype(str).tolist()
+
+
+def decision_tree_model(X, y, fname='risk_app/picture/decision_tree.png', dpi=None):
+    from .render import DEFAULT_DPI, render_decision_tree, write_png
+
+    clf = train_decision_tree(X, y)
+    write_png(render_decision_tree(clf, X.columns, np.unique(y).astype(str), dpi or DEFAULT_DPI), fname)
+    return clf
+
+
+def tree_node_table(clf, feature_names):
+    """将决策树展开为扁平的节点表（按节点编号排列，叶子节点的left/right为-1）"""
+    tree = clf.tree_
+    is_leaf = tree.children_left == -1
+    counts = tree.value[:, 0, :]
+    return {
+        'classes': [str(c) for c in clf.classes_],
+        'feature': [None if leaf else feature_names[f] for f, leaf in zip(tree.feature, is_leaf)],
+        'threshold': [None if leaf else round(float(t), 6) for t, leaf in zip(tree.threshold, is_leaf)],
+        'left': tree.children_left.tolist(),
+        'right': tree.children_right.tolist(),
+        'n_samples': tree.n_node_samples.tolist(),
+        'impurity': tree.impurity.round(6).tolist(),
+        'value': counts.round(6).tolist(),
+        'class': [str(clf.classes_[i]) for i in counts.argmax(axis=1)],
+    }
+
+
 # Monte Carlo Simulation
 def monte_carlo_simulation(model_func, param_dists, n_simulations=1000):
     outputs = []
@@ -51,17 +257,404 @@ def monte_carlo_simulation(model_func, param_dists, n_simulations=1000):
     return outputs
 
 
+# Gaussian Copula 相关抽样
+def risk_marginals(user_revenue, user_cost, user_revenue_std, user_cost_std):
+    """默认的边缘分布：收入、成本服从正态分布，损失概率服从Beta(2, 5)"""
+    return {
+        'revenue': {'dist': 'normal', 'mean': user_revenue, 'std': user_revenue_std},
+        'cost': {'dist': 'normal', 'mean': user_cost, 'std': user_cost_std},
+        'probability_of_loss': {'dist': 'beta', 'a': 2, 'b': 5},
+    }
+
+
+@lru_cache(maxsize=64)
+def _cholesky_factor(corr_key):
+    """按相关系数矩阵缓存Cholesky分解结果"""
+    corr = np.array(corr_key, dtype=float)
+    if not np.allclose(corr, corr.T) or not np.allclose(np.diag(corr), 1.0):
+        raise ValueError("相关系数矩阵必须对称且对角线为1")
+    try:
+        factor = np.linalg.cholesky(corr)
+    except np.linalg.LinAlgError:
+        raise ValueError("相关系数矩阵必须为正定矩阵")
+    factor.setflags(write=False)
+    return factor
+
+
+_PPF_TABLE_POINTS = 8193
+
+
+@lru_cache(maxsize=64)
+def _beta_ppf_table(a, b, points=_PPF_TABLE_POINTS):
+    """Beta分布在标准正态刻度上的逆CDF查找表（betaincinv逐点计算过慢）"""
+    z_grid = np.linspace(-8.5, 8.5, points)
+    x_grid = special.betaincinv(a, b, special.ndtr(z_grid))
+    return z_grid, x_grid
+
+
+# 各分布类型所需的参数
+MARGINAL_PARAMS = {
+    'normal': ('mean', 'std'),
+    'lognormal': ('mu', 'sigma'),
+    'beta': ('a', 'b'),
+    'uniform': ('low', 'high'),
+    'triangular': ('low', 'mode', 'high'),
+}
+
+
+def validate_marginals(marginals):
+    """
+    校验前端给出的边缘分布 {参数名: {'dist', ...}}
+
+    参数名须为 RISK_PARAMS 之一，分布须为 MARGINAL_PARAMS 中的类型且参数齐全、为有限数值；不合法时抛出ValueError。
+    """
+    if not isinstance(marginals, dict):
+        raise ValueError("marginals 须为 {参数名: 分布} 字典")
+    for name, spec in marginals.items():
+        if name not in RISK_PARAMS:
+            raise ValueError(f"未知的参数: {name}，可选: {', '.join(RISK_PARAMS)}")
+        if not isinstance(spec, dict):
+            raise ValueError(f"参数{name}的分布须为字典")
+        dist = spec.get('dist', 'normal')
+        if dist not in MARGINAL_PARAMS:
+            raise ValueError(f"不支持的分布类型: {dist}，可选: {', '.join(MARGINAL_PARAMS)}")
+        values = {}
+        for key in MARGINAL_PARAMS[dist]:
+            try:
+                values[key] = float(spec[key])
+            except KeyError:
+                raise ValueError(f"参数{name}的{dist}分布缺少{key}")
+            except (TypeError, ValueError):
+                raise ValueError(f"参数{name}的{key}须为数值")
+            if not np.isfinite(values[key]):
+                raise ValueError(f"参数{name}的{key}须为有限数值")
+        if dist in ('normal', 'lognormal') and values[MARGINAL_PARAMS[dist][1]] < 0:
+            raise ValueError(f"参数{name}的标准差不能为负")
+        if dist == 'beta' and not (values['a'] > 0 and values['b'] > 0):
+            raise ValueError(f"参数{name}的Beta分布参数须为正")
+        if dist in ('uniform', 'triangular') and not values['low'] < values['high']:
+            raise ValueError(f"参数{name}须满足 low < high")
+        if dist == 'triangular' and not values['low'] <= values['mode'] <= values['high']:
+            raise ValueError(f"参数{name}须满足 low <= mode <= high")
+    return marginals
+
+
+def marginal_from_normal(spec, z):
+    """将标准正态样本z通过逆CDF变换为指定的边缘分布（向量化）"""
+    dist = spec.get('dist', 'normal')
+    if dist == 'normal':
+        return spec['mean'] + spec['std'] * z
+    if dist == 'lognormal':
+        return np.exp(spec['mu'] + spec['sigma'] * z)
+    if dist == 'beta':
+        # 样本量小于查找表时直接计算更快（例如大量不同参数的情景）
+        if np.size(z) < _PPF_TABLE_POINTS:
+            return special.betaincinv(spec['a'], spec['b'], special.ndtr(z))
+        z_grid, x_grid = _beta_ppf_table(float(spec['a']), float(spec['b']))
+        return np.interp(z, z_grid, x_grid)
+    u = special.ndtr(z)
+    if dist == 'uniform':
+        return spec['low'] + (spec['high'] - spec['low']) * u
+    if dist == 'triangular':
+        low, mode, high = spec['low'], spec['mode'], spec['high']
+        split = (mode - low) / (high - low)
+        left = low + np.sqrt(u * (high - low) * (mode - low))
+        right = high - np.sqrt((1 - u) * (high - low) * (high - mode))
+        return np.where(u < split, left, right)
+    raise ValueError(f"不支持的分布类型: {dist}")
+
+
+def correlation_factor(corr, dim=len(RISK_PARAMS)):
+    """返回相关系数矩阵的Cholesky因子，无相关性时返回None"""
+    if corr is None:
+        return None
+    corr_key = tuple(tuple(float(c) for c in row) for row in corr)
+    if len(corr_key) != dim or any(len(row) != dim for row in corr_key):
+        raise ValueError(f"相关系数矩阵必须为 {dim}x{dim}")
+    return _cholesky_factor(corr_key)
+
+
+def correlated_normals(n, corr=None, dim=len(RISK_PARAMS), rng=None):
+    """生成n组相关的标准正态样本，形状为 (n, dim)"""
+    rng = np.random.default_rng() if rng is None else rng
+    z = rng.standard_normal((n, dim))
+    factor = correlation_factor(corr, dim)
+    if factor is not None:
+        z = z @ factor.T
+    return z
+
+
+def gaussian_copula_sample(marginals, corr=None, n=1000, seed=None):
+    """高斯Copula批量相关抽样，返回 {参数名: 样本数组}"""
+    names = list(marginals)
+    z = correlated_normals(n, corr, len(names), np.random.default_rng(seed))
+    return {name: marginal_from_normal(marginals[name], z[:, i]) for i, name in enumerate(names)}
+
+
+def correlated_monte_carlo(model_func, marginals, corr=None, n_simulations=1000, seed=None):
+    """相关输入的向量化蒙特卡洛模拟（model_func需支持数组输入）"""
+    samples = gaussian_copula_sample(marginals, corr, n_simulations, seed)
+    return np.asarray(model_func(**samples), dtype=float)
+
+
+def monte_carlo_summary(outputs, bins=30, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95)):
+    """蒙特卡洛结果的紧凑摘要：直方图分箱边界与频数、均值、标准差及分位数"""
+    outputs = np.asarray(outputs, dtype=float)
+    counts, edges = np.histogram(outputs, bins=bins)
+    return {
+        'n': int(outputs.size),
+        'mean': float(outputs.mean()),
+        'std': float(outputs.std()),
+        'quantiles': {str(q): float(v) for q, v in zip(quantiles, np.quantile(outputs, quantiles))},
+        'bin_edges': edges.tolist(),
+        'counts': counts.tolist(),
+    }
+
+
+
+def is_loss(outputs, loss_threshold=0.0):
+    """亏损判定（各处统一使用）：输出不超过阈值即为亏损；示例风险模型的输出下限为0，亏损时恰好等于0"""
+    return np.asarray(outputs) <= loss_threshold
+
+
+# Bootstrap Confidence Intervals
+def _bootstrap_resample(x, n_bootstrap, quantiles, rng, max_elements=2 ** 23):
+    """小样本：按块生成 (B, n) 的重抽样下标矩阵，返回各次重抽样的均值与分位数"""
+    n = x.size
+    rows = max(1, max_elements // n)
+    means, qs = [], []
+    for start in range(0, n_bootstrap, rows):
+        resampled = x[rng.integers(0, n, size=(min(rows, n_bootstrap - start), n))]
+        means.append(resampled.mean(axis=1))
+        qs.append(np.quantile(resampled, quantiles, axis=1).T)
+    return np.concatenate(means), np.concatenate(qs)
+
+
+def _bootstrap_binned(x, n_bootstrap, quantiles, rng, bins):
+    """
+    大样本：排序后划分为等频分箱，每次重抽样只抽取各箱的多项分布计数
+
+    均值 = 各箱计数×箱均值，再加上箱内抽样的正态波动（方差为 计数×箱内方差）；
+    分位数先按累计计数定位所在的箱，再在箱内按比例取对应的次序统计量。
+    """
+    n = x.size
+    x = np.sort(x)
+    edges = np.linspace(0, n, min(bins, n) + 1).astype(int)
+    sizes = np.diff(edges)
+    sums = np.add.reduceat(x, edges[:-1])
+    bin_mean = sums / sizes
+    bin_var = np.maximum(np.add.reduceat(x * x, edges[:-1]) / sizes - bin_mean ** 2, 0)
+    counts = rng.multinomial(n, sizes / n, size=n_bootstrap)
+
+    noise = rng.standard_normal(counts.shape) * np.sqrt(counts * bin_var)
+    means = (counts @ bin_mean + noise.sum(axis=1)) / n
+
+    cum = np.cumsum(counts, axis=1)
+    qs = np.empty((n_bootstrap, len(quantiles)))
+    rows = np.arange(n_bootstrap)
+    for j, q in enumerate(quantiles):
+        target = q * (n - 1)
+        b = np.minimum((cum <= target).sum(axis=1), len(sizes) - 1)
+        before = cum[rows, b] - counts[rows, b]
+        frac = (target - before) / np.maximum(counts[rows, b], 1)
+        offset = np.minimum((frac * sizes[b]).astype(int), sizes[b] - 1)
+        qs[:, j] = x[edges[b] + offset]
+    return means, qs
+
+
+def bootstrap_ci(outputs, n_bootstrap=1000, quantiles=(0.05, 0.5, 0.95), loss_threshold=0.0,
+                 confidence=0.95, seed=None, max_resample=20000, bins=4096):
+    """
+    模拟统计量（均值、分位数、亏损概率）的百分位bootstrap置信区间
+
+    样本数不超过max_resample时使用向量化下标矩阵做精确重抽样；
+    更大的样本使用等频分箱的多项分布计数，10^6个样本的1000次重抽样只需秒级。
+    亏损次数在重抽样下恰好服从 Binomial(n, p_loss)，直接抽样。
+    """
+    x = np.asarray(outputs, dtype=float).ravel()
+    n = x.size
+    rng = np.random.default_rng(seed)
+    if n <= max_resample:
+        method = 'resample'
+        means, qs = _bootstrap_resample(x, n_bootstrap, quantiles, rng)
+    else:
+        method = 'binned'
+        means, qs = _bootstrap_binned(x, n_bootstrap, quantiles, rng, bins)
+    p_loss = float(np.mean(is_loss(x, loss_threshold)))
+    losses = rng.binomial(n, p_loss, size=n_bootstrap) / n
+
+    alpha = (1 - confidence) / 2
+
+    def interval(estimate, replicates):
+        low, high = np.quantile(replicates, [alpha, 1 - alpha])
+        return {'estimate': float(estimate), 'low': float(low), 'high': float(high),
+                'std_error': float(replicates.std(ddof=1))}
+
+    return {
+        'n': int(n),
+        'n_bootstrap': int(n_bootstrap),
+        'confidence': confidence,
+        'method': method,
+        'mean': interval(x.mean(), means),
+        'quantiles': {str(q): interval(v, qs[:, j])
+                      for j, (q, v) in enumerate(zip(quantiles, np.quantile(x, quantiles)))},
+        'p_loss': interval(p_loss, losses),
+    }
+
+
+# Scenario Comparison (common random numbers)
+def _scenario_marginal(specs, z):
+    """同一输入在各情景下的样本，返回形状 (S, n) 或可广播的 (1, n)"""
+    if all(spec == specs[0] for spec in specs):
+        return marginal_from_normal(specs[0], z)[None, :]
+    if all(spec.get('dist', 'normal') == 'normal' for spec in specs):
+        mean = np.array([spec['mean'] for spec in specs], dtype=float)[:, None]
+        std = np.array([spec['std'] for spec in specs], dtype=float)[:, None]
+        return mean + std * z[None, :]
+    return np.stack([marginal_from_normal(spec, z) for spec in specs])
+
+
+def scenario_batch(model_func, scenarios, corr=None, n_simulations=10000, seed=None,
+                   baseline=0, loss_threshold=0.0, quantiles=(0.05, 0.5, 0.95)):
+    """
+    公共随机数（CRN）情景批量比较
+
+    scenarios为各情景的边缘分布列表（参数名需一致）。底层标准正态变量只抽取一次，
+    各情景通过广播变换得到样本，因此情景间的差异不含独立抽样带来的噪声。
+    返回各情景的统计量，以及相对基准情景的配对差异。
+    """
+    names = list(scenarios[0])
+    if any(list(marginals) != names for marginals in scenarios):
+        raise ValueError("所有情景的输入参数必须一致")
+    z = correlated_normals(n_simulations, corr, len(names), np.random.default_rng(seed))
+    samples = {name: _scenario_marginal([marginals[name] for marginals in scenarios], z[:, i])
+               for i, name in enumerate(names)}
+    outputs = np.broadcast_to(np.asarray(model_func(**samples), dtype=float), (len(scenarios), n_simulations))
+
+    q = np.quantile(outputs, quantiles, axis=1)
+    loss = is_loss(outputs, loss_threshold)
+    stats = [{
+        'mean': float(outputs[i].mean()),
+        'std': float(outputs[i].std()),
+        'quantiles': {str(level): float(q[k, i]) for k, level in enumerate(quantiles)},
+        'p_loss': float(loss[i].mean()),
+    } for i in range(len(scenarios))]
+
+    diff = outputs - outputs[baseline]
+    diff_se = diff.std(axis=1) / np.sqrt(n_simulations)
+    # 假设两情景独立抽样时的标准误，用于对比CRN带来的方差缩减
+    var = outputs.var(axis=1)
+    independent_se = np.sqrt((var + var[baseline]) / n_simulations)
+    differences = [{
+        'scenario': i,
+        'mean_diff': float(diff[i].mean()),
+        'std_error': float(diff_se[i]),
+        'ci95': [float(diff[i].mean() - 1.96 * diff_se[i]), float(diff[i].mean() + 1.96 * diff_se[i])],
+        'p_better': float((diff[i] > 0).mean()),
+        'p_loss_diff': float(loss[i].mean() - loss[baseline].mean()),
+        'independent_std_error': float(independent_se[i]),
+    } for i in range(len(scenarios)) if i != baseline]
+
+    return {
+        'n_simulations': n_simulations,
+        'baseline': baseline,
+        'scenarios': stats,
+        'differences': differences,
+    }
+
+
+# Tail Risk (VaR / CVaR)
+TAIL_LEVELS = (0.95, 0.99, 0.999)
+
+
+def weighted_tail_metrics(outputs, weights=None, levels=TAIL_LEVELS):
+    """加权样本的左尾VaR与CVaR（输出越小风险越大）"""
+    outputs = np.asarray(outputs, dtype=float)
+    weights = np.ones_like(outputs) if weights is None else np.asarray(weights, dtype=float)
+    order = np.argsort(outputs)
+    x = outputs[order]
+    w = weights[order] / weights.sum()
+    cum_w = np.cumsum(w)
+    cum_wx = np.cumsum(w * x)
+
+    metrics = []
+    for level in levels:
+        p = 1 - level
+        k = min(int(np.searchsorted(cum_w, p)), len(x) - 1)
+        var = x[k]
+        below_w = cum_w[k - 1] if k > 0 else 0.0
+        below_wx = cum_wx[k - 1] if k > 0 else 0.0
+        # 分位点处的样本只计入恰好补足p的那部分权重
+        cvar = (below_wx + (p - below_w) * var) / p
+        metrics.append({'level': level, 'var': float(var), 'cvar': float(cvar)})
+    return metrics
+
+
+def tail_risk(model_func, marginals, corr=None, levels=TAIL_LEVELS, n_samples=20000,
+              pilot_size=2000, elite_ratio=0.1, defensive=0.1, seed=None):
+    """
+    基于重要性抽样的尾部风险度量
+
+    先用交叉熵迭代在标准正态空间中求出指向损失区域的均值偏移，
+    再从"原分布+偏移分布"的防御性混合分布抽样，并按似然比加权估计VaR/CVaR。
+    """
+    levels = [float(level) for level in levels]
+    if not levels or not all(0 < level < 1 for level in levels):
+        raise ValueError("置信水平须在 (0, 1) 之间")
+    rng = np.random.default_rng(seed)
+    names = list(marginals)
+    factor = correlation_factor(corr, len(names))
+    target = 1 - max(levels)
+
+    def evaluate(eps):
+        z = eps if factor is None else eps @ factor.T
+        samples = {name: marginal_from_normal(marginals[name], z[:, i]) for i, name in enumerate(names)}
+        return np.asarray(model_func(**samples), dtype=float)
+
+    def likelihood_ratio(eps, shift):
+        # 原分布密度 / 混合分布密度
+        ratio = np.exp(eps @ shift - shift @ shift / 2)
+        return 1 / (defensive + (1 - defensive) * ratio)
+
+    # 交叉熵迭代：逐步把抽样中心推向最差的elite_ratio样本，直到覆盖目标尾部
+    shift = np.zeros(len(names))
+    for _ in range(10):
+        eps = rng.standard_normal((pilot_size, len(names))) + shift
+        outputs = evaluate(eps)
+        weights = np.exp(-eps @ shift + shift @ shift / 2)
+        threshold = np.quantile(outputs, elite_ratio)
+        target_var = weighted_tail_metrics(outputs, weights, [1 - target])[0]['var']
+        reached = threshold <= target_var
+        elite = outputs <= (target_var if reached else threshold)
+        shift = (weights[elite, None] * eps[elite]).sum(axis=0) / weights[elite].sum()
+        if reached:
+            break
+
+    # 防御性混合抽样：defensive比例来自原分布，其余来自偏移分布
+    eps = rng.standard_normal((n_samples, len(names)))
+    eps[rng.random(n_samples) >= defensive] += shift
+    weights = likelihood_ratio(eps, shift)
+    outputs = evaluate(eps)
+
+    return {
+        'metrics': weighted_tail_metrics(outputs, weights, levels),
+        'n_samples': n_samples,
+        'effective_sample_size': float(weights.sum() ** 2 / (weights ** 2).sum()),
+        'shift': dict(zip(names, shift.round(4).tolist())),
+    }
+
+
 # Example risk model function
 def example_risk_model(revenue, cost, probability_of_loss):
     margin = revenue - cost
     penalty = np.exp(probability_of_loss)  # 非线性风险影响
-    adjusted_margin = np.log1p(max(margin, 0))  # 非线性利润调整
+    adjusted_margin = np.log1p(np.maximum(margin, 0))  # 非线性利润调整
     risk_adjusted_return = adjusted_margin / penalty
     return risk_adjusted_return
 
 # Visualization
 
-# def plot_sensitivity(results):
+# def plot_sensitivity(results, fname='risk_app/picture/sensitivity.png'):
 #     plt.figure(figsize=(10, 6))
 #     for param, (values, outputs) in results.items():
 #         plt.plot(values, outputs, label=param)
@@ -72,34 +665,22 @@ def example_risk_model(revenue, cost, probability_of_loss):
 #     plt.grid(True)
 #     plt.savefig('picture/sensitivity.png')
 #     plt.show()
-def plot_sensitivity(results):
-    n = len(results)
-    fig, axs = plt.subplots(n, 1, figsize=(8, 4 * n))
-
-    if n == 1:
-        axs = [axs]
-
-    for ax, df in zip(axs, results):
-        param = df['param_name'].iloc[0]
-        ax.plot(df[param], df['output'], marker='o')
-        ax.set_xlabel(param)
-        ax.set_ylabel("Model Output")
-        ax.set_title(f"Sensitivity of Output to {param}")
-        ax.grid(True)
-
-    plt.tight_layout()
-    plt.savefig('risk_app/picture/sensitivity.png')
-    # plt.show()
-
-
-def plot_monte_carlo(outputs):
-    sns.histplot(outputs, kde=True, bins=30)
-    plt.title("Monte Carlo Simulation Results")
-    plt.xlabel("Simulated Output")
-    plt.ylabel("Frequency")
-    plt.grid(True)
-    plt.savefig('risk_app/picture/monte_carlo.png')
-    # plt.show()
+def plot_sensitivity(results, fname='risk_app/picture/sensitivity.png', dpi=None):
+    from .render import DEFAULT_DPI, render_sensitivity, write_png
+
+    write_png(render_sensitivity(results, dpi or DEFAULT_DPI), fname)
+
+
+def plot_decision_tree(clf, feature_names, fname='risk_app/picture/decision_tree.png', dpi=None):
+    from .render import DEFAULT_DPI, render_decision_tree, write_png
+
+    write_png(render_decision_tree(clf, feature_names, clf.classes_.astype(str), dpi or DEFAULT_DPI), fname)
+
+
+def plot_monte_carlo(outputs, fname='risk_app/picture/monte_carlo.png', dpi=None):
+    from .render import DEFAULT_DPI, render_monte_carlo, write_png
+
+    write_png(render_monte_carlo(outputs, dpi or DEFAULT_DPI), fname)
 
 
 # Example usage
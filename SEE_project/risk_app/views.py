@@ -1,21 +1,50 @@
+import io
 import json
-import os
 
+from django.conf import settings
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 
+from .formula import FormulaError, get_formula, register_formula
+from .jobs import QueueFull, render_queue
+from .store import artifact_store
+from .surrogate import (fit_surrogate, get_surrogate, query_whatif, simulate_stats, surrogate_key, validate_domain,
+                        SURROGATE_STATS)
 from .utils import *
 
 
-# Create your views here.
-@csrf_exempt
-def pic_view(request):
-    # 前端输入
-    data = json.loads(request.body.decode('utf-8'))
+# 绘图请求未指定随机种子时使用固定种子，使相同输入可以命中图片缓存
+DEFAULT_PIC_SEED = 42
+
+
+def parse_marginals(data):
+    """根据前端输入构造收入、成本、损失概率的边缘分布（未给出标准差时按seed随机取；marginals 须通过校验）"""
+    rng = np.random.default_rng(data.get('seed'))
+    user_revenue = data['user_revenue']
+    user_cost = data['user_cost']
+    user_revenue_std = data.get('user_revenue_std', user_revenue * rng.uniform(0.05, 0.15))
+    user_cost_std = data.get('user_cost_std', user_cost * rng.uniform(0.05, 0.3))
+    marginals = risk_marginals(user_revenue, user_cost, user_revenue_std, user_cost_std)
+    marginals.update(validate_marginals(data.get('marginals') or {}))
+    return marginals
+
+
+def resolve_model(data):
+    """请求中指定了formula（名称、哈希key或表达式）时使用自定义公式，否则使用示例风险模型"""
+    if data.get('formula'):
+        return get_formula(data['formula'])
+    return example_risk_model
+
+
+def parse_tree_samples(data):
+    """决策树训练样本数，上限由 RISK_TREE_MAX_SAMPLES 控制"""
+    return min(max(int(data.get('n_samples', 100)), 10), settings.RISK_TREE_MAX_SAMPLES)
+
+
+def parse_sensitivity(data):
+    """根据前端输入构造敏感性分析的基准值与参数范围（收入、成本上下浮动20%）"""
     user_revenue = data['user_revenue']
     user_cost = data['user_cost']
-    # ----------------------------------------------------------
-    # 敏感性分析（sensitivity_analysis）
     base_values = {
         'revenue': user_revenue,
         'cost': user_cost,
@@ -31,51 +60,408 @@ def pic_view(request):
         'cost': (user_cost_low, user_cost_high),
         'probability_of_loss': (0.1, 0.5)
     }
-    sensitivity_results = sensitivity_analysis(example_risk_model, param_ranges, base_values)
-    plot_sensitivity(sensitivity_results)
+    return base_values, param_ranges
+
+
+def render_pictures(key, model_func, base_values, param_ranges, marginals, correlation, seed, n_samples, dpi):
+    """在后台线程中完成敏感性分析、蒙特卡洛模拟、决策树训练及绘图，存入图片存储并返回url"""
+    mc_seed, tree_seed = np.random.SeedSequence(seed).spawn(2)
+    buffers = {name: io.BytesIO() for name in ('sensitivity.png', 'monte_carlo.png', 'decision_tree.png')}
+    # 敏感性分析（sensitivity_analysis）
+    sensitivity_results = sensitivity_analysis(model_func, param_ranges, base_values)
+    plot_sensitivity(sensitivity_results, buffers['sensitivity.png'], dpi)
     # ----------------------------------------------------------
-    user_revenue_std = user_revenue * np.random.uniform(0.05, 0.15)
-    user_cost_std = user_cost * np.random.uniform(0.05, 0.3)
+    # 蒙特卡洛模拟（收入、成本、损失概率可通过相关系数矩阵关联）
+    mc_outputs = correlated_monte_carlo(model_func, marginals, correlation, seed=mc_seed)
+    plot_monte_carlo(mc_outputs, buffers['monte_carlo.png'], dpi)
     # ----------------------------------------------------------
-    # 蒙特卡洛模拟
-    param_dists = {
-        'revenue': lambda: np.random.normal(user_revenue, user_revenue_std),
-        'cost': lambda: np.random.normal(user_cost, user_cost_std),
-        'probability_of_loss': lambda: np.clip(np.random.beta(2, 5), 0, 1)
+    # 决策树（与蒙特卡洛共用同一个向量化模型函数，整列一次计算；按参数缓存）
+    clf, features = fitted_risk_tree(model_func, marginals, correlation, n_samples, seed=tree_seed)
+    plot_decision_tree(clf, features, buffers['decision_tree.png'], dpi)
+
+    return artifact_store.put(key, {name: buffer.getvalue() for name, buffer in buffers.items()})
+
+
+def analysis_data(model_func, base_values, param_ranges, marginals, correlation, seed, n_samples):
+    """与render_pictures相同的分析，但只返回数值结果，由前端自行绘图（不导入matplotlib）"""
+    # 前两个子种子与render_pictures一致，第三个用于bootstrap
+    mc_seed, tree_seed, ci_seed = np.random.SeedSequence(seed).spawn(3)
+    grid = sensitivity_grid(model_func, param_ranges, base_values)
+    mc_outputs = correlated_monte_carlo(model_func, marginals, correlation, seed=mc_seed)
+    clf, features = fitted_risk_tree(model_func, marginals, correlation, n_samples, seed=tree_seed)
+    summary = monte_carlo_summary(mc_outputs)
+    summary['confidence_intervals'] = bootstrap_ci(mc_outputs, seed=ci_seed)
+    return {
+        'sensitivity': {
+            'params': grid['params'],
+            'values': grid['values'].tolist(),
+            'outputs': grid['outputs'].tolist(),
+        },
+        'monte_carlo': summary,
+        'decision_tree': tree_node_table(clf, features),
     }
-    mc_outputs = monte_carlo_simulation(example_risk_model, param_dists)
-    plot_monte_carlo(mc_outputs)
-    # ----------------------------------------------------------
-    # 决策树
-    data = pd.DataFrame({
-        'revenue': np.random.normal(user_revenue, user_revenue_std, 100),
-        'cost': np.random.normal(user_cost, user_cost_std, 100),
-        'probability_of_loss': np.clip(np.random.beta(2, 5, 100), 0, 1)
+
+
+# Create your views here.
+@csrf_exempt
+def pic_view(request):
+    # 前端输入
+    data = json.loads(request.body.decode('utf-8'))
+    data.setdefault('seed', DEFAULT_PIC_SEED)
+    try:
+        dpi = min(max(int(data.get('dpi', settings.RISK_RENDER_DPI)), 50), 300)
+        n_samples = parse_tree_samples(data)
+        model_func = resolve_model(data)
+        base_values, param_ranges = parse_sensitivity(data)
+        marginals = parse_marginals(data)
+        correlation = data.get('correlation')
+        correlation_factor(correlation, len(marginals))
+    except (KeyError, TypeError, ValueError) as e:
+        return JsonResponse({'code': '400', 'msg': f'无效的参数: {e}'}, status=400)
+
+    # 默认返回数值结果；format=png 时才在服务端出图
+    if data.get('format', 'data') != 'png':
+        try:
+            result = analysis_data(model_func, base_values, param_ranges, marginals, correlation, data['seed'],
+                                   n_samples)
+        except (TypeError, ValueError) as e:
+            return JsonResponse({'code': '400', 'msg': f'无效的参数: {e}'}, status=400)
+        return JsonResponse({
+            'code': '200',
+            'msg': result
+        })
+
+    # 相同输入与种子的图片直接从存储中返回
+    key = artifact_store.make_key({
+        'model': model_key(model_func),
+        'base_values': base_values,
+        'param_ranges': param_ranges,
+        'marginals': marginals,
+        'correlation': correlation,
+        'seed': data['seed'],
+        'n_samples': n_samples,
+        'dpi': dpi,
+    })
+    urls = artifact_store.get(key)
+    if urls is not None:
+        return JsonResponse({
+            'code': '200',
+            'msg': {
+                'key': key,
+                'status': 'done',
+                'urls': urls
+            }
+        })
+
+    # 绘图交给后台线程池，立即返回任务id供前端轮询
+    try:
+        job_id = render_queue.submit(render_pictures, key, model_func, base_values, param_ranges,
+                                     marginals, correlation, data['seed'], n_samples, dpi, key=key)
+    except QueueFull as e:
+        response = JsonResponse({'code': '503', 'msg': str(e)}, status=503)
+        response['Retry-After'] = '5'
+        return response
+    return JsonResponse({
+        'code': '200',
+        'msg': {
+            'key': key,
+            'job_id': job_id,
+            'status': 'pending'
+        }
+    }, status=202)
+
+
+def lookup_job(request, job_id):
+    """
+    查询绘图任务：任务状态只保存在提交它的进程内，多进程部署时轮询可能落到其他进程；
+    此时按请求参数 key 查内容寻址的图片存储，已生成则视为完成。返回 (job, 是否找到)；key 不是内容哈希格式时视为未找到。
+    """
+    job = render_queue.get(job_id)
+    if job is not None:
+        return job, True
+    key = request.GET.get('key')
+    if not artifact_store.valid_key(key):
+        return None, False
+    urls = artifact_store.get(key)
+    if urls is not None:
+        return {'status': 'done', 'error': None, 'result': urls}, True
+    # 可能仍在其他进程中执行；客户端超时后可重新提交 pic/（相同输入按key去重）
+    return {'status': 'unknown', 'error': None, 'result': None}, True
+
+
+# 查询绘图任务状态（多进程部署时请带上 ?key=）
+@csrf_exempt
+def job_view(request, job_id):
+    job, found = lookup_job(request, job_id)
+    if not found:
+        return JsonResponse({'code': '404', 'msg': '任务不存在或已过期'}, status=404)
+    return JsonResponse({
+        'code': '200',
+        'msg': {
+            'job_id': job_id,
+            'status': job['status'],
+            'error': job['error'],
+        }
     })
-    data['risk_score'] = data.apply(
-        lambda row: example_risk_model(row['revenue'], row['cost'], row['probability_of_loss']), axis=1)
-    data['risk_level'] = pd.qcut(data['risk_score'], q=3, labels=['Low', 'Medium', 'High'])
-    decision_tree_model(data[['revenue', 'cost', 'probability_of_loss']], data['risk_level'])
-
-    # 返回图片url
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    picture_dir = os.path.join(current_dir, 'picture')
-    print(picture_dir)
-    picture_urls = []
-
-    # 检查目录是否存在
-    if os.path.exists(picture_dir):
-        # 遍历目录中的图片文件
-        for filename in os.listdir(picture_dir):
-            if filename.endswith(('.jpg', '.jpeg', '.png', '.gif')):
-                # 构建完整的图片URL
-                picture_url = 'static/' + f"picture/{filename}"
-                print('test', picture_url)
-                picture_urls.append(picture_url)
+
+
+# 获取绘图任务结果（图片url）
+@csrf_exempt
+def job_result_view(request, job_id):
+    job, found = lookup_job(request, job_id)
+    if not found:
+        return JsonResponse({'code': '404', 'msg': '任务不存在或已过期'}, status=404)
+    if job['status'] == 'failed':
+        return JsonResponse({'code': '500', 'msg': job['error']}, status=500)
+    if job['status'] != 'done':
+        return JsonResponse({'code': '202', 'msg': job['status']}, status=202)
+    return JsonResponse({
+        'code': '200',
+        'msg': job['result']
+    })
+
+
+# 尾部风险指标（VaR / CVaR）
+@csrf_exempt
+def tail_view(request):
+    data = json.loads(request.body.decode('utf-8'))
+    try:
+        n_samples = int(data.get('n_samples', 20000))
+        if not 1000 <= n_samples <= settings.RISK_TAIL_MAX_SAMPLES:
+            return JsonResponse({'code': '400', 'msg': f'抽样次数须在1000到{settings.RISK_TAIL_MAX_SAMPLES}之间'},
+                                status=400)
+        result = tail_risk(
+            resolve_model(data),
+            parse_marginals(data),
+            data.get('correlation'),
+            levels=data.get('levels', TAIL_LEVELS),
+            n_samples=n_samples,
+            seed=data.get('seed'),
+        )
+    except (KeyError, TypeError, ValueError) as e:
+        return JsonResponse({'code': '400', 'msg': f'无效的分布参数: {e}'}, status=400)
+    return JsonResponse({
+        'code': '200',
+        'msg': result
+    })
+
+
+# 蒙特卡洛统计量的bootstrap置信区间（支持百万级样本）
+@csrf_exempt
+def bootstrap_view(request):
+    data = json.loads(request.body.decode('utf-8'))
+    try:
+        n_simulations = int(data.get('n_simulations', 100000))
+        n_bootstrap = int(data.get('n_bootstrap', 1000))
+        if not 10 <= n_simulations <= settings.RISK_SCENARIO_MAX_SAMPLES or not 10 <= n_bootstrap <= 10000:
+            return JsonResponse({'code': '400', 'msg': '模拟次数或bootstrap次数超出范围'}, status=400)
+        mc_seed, ci_seed = np.random.SeedSequence(data.get('seed')).spawn(2)
+        outputs = correlated_monte_carlo(resolve_model(data), parse_marginals(data), data.get('correlation'),
+                                         n_simulations=n_simulations, seed=mc_seed)
+        result = bootstrap_ci(
+            outputs,
+            n_bootstrap=n_bootstrap,
+            quantiles=data.get('quantiles', (0.05, 0.5, 0.95)),
+            loss_threshold=float(data.get('loss_threshold', 0.0)),
+            confidence=float(data.get('confidence', 0.95)),
+            seed=ci_seed,
+        )
+    except (KeyError, TypeError, ValueError) as e:
+        return JsonResponse({'code': '400', 'msg': f'无效的参数: {e}'}, status=400)
+    return JsonResponse({
+        'code': '200',
+        'msg': result
+    })
+
+
+# 敏感性分析数据（龙卷风图 + 双参数交互曲面）
+@csrf_exempt
+def sensitivity_view(request):
+    data = json.loads(request.body.decode('utf-8'))
+    try:
+        base_values, param_ranges = parse_sensitivity(data)
+        steps = int(data.get('steps', 20))
+        pairs = [tuple(pair) for pair in data.get('pairs') or []]
+        # 每个双参数曲面有 steps² 个点，参数对须互不相同
+        if not 2 <= steps <= settings.RISK_SENSITIVITY_MAX_STEPS:
+            return JsonResponse({'code': '400', 'msg': f'steps须在2到{settings.RISK_SENSITIVITY_MAX_STEPS}之间'},
+                                status=400)
+        if len(set(pairs)) != len(pairs) or len(pairs) * steps ** 2 > settings.RISK_SENSITIVITY_MAX_POINTS:
+            return JsonResponse({'code': '400', 'msg': f'参数对重复或 参数对数×steps² 超过'
+                                                      f'{settings.RISK_SENSITIVITY_MAX_POINTS}'}, status=400)
+        grid = sensitivity_grid(
+            resolve_model(data),
+            param_ranges,
+            base_values,
+            steps=steps,
+            pairs=pairs,
+        )
+    except (KeyError, TypeError, ValueError) as e:
+        return JsonResponse({'code': '400', 'msg': f'无效的参数: {e}'}, status=400)
+    return JsonResponse({
+        'code': '200',
+        'msg': {
+            'params': grid['params'],
+            'values': grid['values'].tolist(),
+            'outputs': grid['outputs'].tolist(),
+            'base_output': grid['base_output'],
+            'tornado': grid['tornado'],
+            'surfaces': [{'pair': list(surface['pair']), 'output': surface['output'].tolist()}
+                         for surface in grid['surfaces']],
+        }
+    })
+
+
+# 全局敏感性分析（Sobol指数）
+@csrf_exempt
+def sobol_view(request):
+    data = json.loads(request.body.decode('utf-8'))
+    try:
+        n_base = int(data.get('n_base', 4096))
+        n_bootstrap = int(data.get('n_bootstrap', 200))
+        # bootstrap的计算量与 n_bootstrap×n_base 成正比
+        if (not 2 <= n_base <= settings.RISK_SOBOL_MAX_BASE or not 10 <= n_bootstrap <= 2000
+                or n_base * n_bootstrap > settings.RISK_SOBOL_MAX_RESAMPLES):
+            return JsonResponse({'code': '400', 'msg': f'n_base须在2到{settings.RISK_SOBOL_MAX_BASE}之间，'
+                                                      f'n_bootstrap须在10到2000之间，且两者之积不超过'
+                                                      f'{settings.RISK_SOBOL_MAX_RESAMPLES}'}, status=400)
+        result = sobol_indices(
+            resolve_model(data),
+            parse_marginals(data),
+            n_base=n_base,
+            n_bootstrap=n_bootstrap,
+            seed=data.get('seed'),
+        )
+    except (KeyError, TypeError, ValueError) as e:
+        return JsonResponse({'code': '400', 'msg': f'无效的分布参数: {e}'}, status=400)
+    return JsonResponse({
+        'code': '200',
+        'msg': result
+    })
+
+
+# 注册自定义风险公式
+@csrf_exempt
+def formula_view(request):
+    data = json.loads(request.body.decode('utf-8'))
+    try:
+        formula = register_formula(data['expression'], data.get('name'))
+    except KeyError:
+        return JsonResponse({'code': '400', 'msg': '缺少expression字段'}, status=400)
+    except FormulaError as e:
+        return JsonResponse({'code': '400', 'msg': str(e)}, status=400)
+    return JsonResponse({
+        'code': '200',
+        'msg': {
+            'key': formula.key,
+            'expression': formula.expression,
+            'inputs': formula.inputs,
+        }
+    })
+
+
+# 批量风险分级：用缓存的决策树为多个候选项目打上 Low / Medium / High 标签
+@csrf_exempt
+def classify_view(request):
+    data = json.loads(request.body.decode('utf-8'))
+    data.setdefault('seed', DEFAULT_PIC_SEED)
+    try:
+        model_func = resolve_model(data)
+        marginals = parse_marginals(data)
+        # 与pic_view使用相同的种子派生方式，保证分级所用的树与页面展示的树一致
+        tree_seed = np.random.SeedSequence(data['seed']).spawn(2)[1]
+        clf, features = fitted_risk_tree(model_func, marginals, data.get('correlation'),
+                                         parse_tree_samples(data), seed=tree_seed)
+        labels = classify_projects(clf, features, data['projects'])
+    except (KeyError, TypeError, ValueError) as e:
+        return JsonResponse({'code': '400', 'msg': f'无效的参数: {e}'}, status=400)
+    return JsonResponse({
+        'code': '200',
+        'msg': {
+            'features': features,
+            'labels': labels,
+        }
+    })
+
+
+# 多情景对比（公共随机数）
+@csrf_exempt
+def scenarios_view(request):
+    data = json.loads(request.body.decode('utf-8'))
+    try:
+        scenarios = data.get('scenarios') or []
+        n_simulations = int(data.get('n_simulations', 10000))
+        if (not isinstance(scenarios, list) or not scenarios or n_simulations < 1
+                or len(scenarios) * n_simulations > settings.RISK_SCENARIO_MAX_SAMPLES):
+            return JsonResponse({'code': '400', 'msg': '情景须为非空列表，且情景数×模拟次数不超过上限'}, status=400)
+        # 未给出标准差的情景共用同一随机种子下的波动比例
+        marginals = [parse_marginals(dict(scenario, seed=data.get('seed'))) for scenario in scenarios]
+        result = scenario_batch(
+            resolve_model(data),
+            marginals,
+            data.get('correlation'),
+            n_simulations=n_simulations,
+            seed=data.get('seed'),
+            baseline=int(data.get('baseline', 0)),
+        )
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        return JsonResponse({'code': '400', 'msg': f'无效的参数: {e}'}, status=400)
+    return JsonResponse({
+        'code': '200',
+        'msg': result
+    })
+
+
+# what-if交互查询：优先由后台拟合的代理模型即时回答，超出验证区域时退回完整模拟
+@csrf_exempt
+def whatif_view(request):
+    data = json.loads(request.body.decode('utf-8'))
+    try:
+        model_func = resolve_model(data)
+        user_revenue = data['user_revenue']
+        user_cost = data['user_cost']
+        # 代理模型的定义域：默认收入、成本上下浮动30%
+        domain = {
+            'revenue': (user_revenue * 0.7, user_revenue * 1.3),
+            'cost': (user_cost * 0.7, user_cost * 1.3),
+            'probability_of_loss': (0.05, 0.6),
+        }
+        domain.update({name: tuple(bounds) for name, bounds in data.get('domain', {}).items() if name in domain})
+        query = data.get('query', {})
+        point = [float(query.get('revenue', user_revenue)), float(query.get('cost', user_cost)),
+                 float(query.get('probability_of_loss', 0.2))]
+        validate_domain(domain)
+        if not 0 < point[2] < 1:
+            raise ValueError(f"损失概率须在 (0, 1) 之间: {point[2]}")
+        correlation = data.get('correlation')
+        correlation_factor(correlation, len(RISK_PARAMS))
+    except (KeyError, TypeError, ValueError) as e:
+        return JsonResponse({'code': '400', 'msg': f'无效的参数: {e}'}, status=400)
+
+    key = surrogate_key(model_func, domain, correlation)
+    surrogate = get_surrogate(key)
+    if surrogate is None:
+        try:
+            render_queue.submit(fit_surrogate, key, model_func, domain, correlation, key='surrogate:' + key)
+        except QueueFull:
+            pass
+
+    if surrogate is not None and surrogate.contains(point):
+        stats, errors = query_whatif(surrogate, point)
+        source = 'surrogate'
     else:
-        print('no info')
-    print(picture_urls)
+        try:
+            values = simulate_stats(model_func, [point], correlation, n_simulations=20000, seed=data.get('seed'))[0]
+        except ValueError as e:
+            return JsonResponse({'code': '400', 'msg': f'无效的参数: {e}'}, status=400)
+        stats, errors = {name: float(v) for name, v in zip(SURROGATE_STATS, values)}, None
+        source = 'simulation'
     return JsonResponse({
         'code': '200',
-        'msg': picture_urls
+        'msg': {
+            'source': source,
+            'surrogate': 'ready' if surrogate is not None else 'fitting',
+            'stats': stats,
+            'error': errors,
+        }
     })